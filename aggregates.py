@@ -0,0 +1,152 @@
+# Cubo de agregados precalculado sobre PERIODO x DEPARTAMENTO x PROVINCIA x DISTRITO
+# Los gráficos consultan este cubo en lugar de volver a agrupar el DataFrame completo.
+import threading
+
+import pandas as pd
+
+# Niveles del cubo, de mayor a menor agregación (el orden importa para los rollups)
+LEVELS = ['PERIODO', 'DEPARTAMENTO', 'PROVINCIA', 'DISTRITO']
+# Medidas que se suman en cada celda del cubo
+MEASURES = ['QRESIDUOS_DOM', 'QRESIDUOS_NO_DOM', 'QRESIDUOS_MUN', 'POB_TOTAL', 'POB_URBANA', 'POB_RURAL']
+# Las poblaciones llegan como int32; sus sumas se guardan en int64 para no desbordar
+POPULATION = ['POB_TOTAL', 'POB_URBANA', 'POB_RURAL']
+
+
+def _normalize_keys(keys):
+    if isinstance(keys, str):
+        keys = [keys]
+    unknown = [k for k in keys if k not in LEVELS]
+    if unknown:
+        raise ValueError(f"Unknown cube levels: {unknown}. Must be in {LEVELS}.")
+    # Mantener el orden canónico para que ('DEPARTAMENTO', 'PERIODO') y al revés compartan entrada
+    return tuple(k for k in LEVELS if k in keys)
+
+
+def _cube_base(df):
+    # Celda más fina del cubo; todo lo demás se obtiene sumando sobre ella. Las medidas
+    # se suman en float64/int64 aunque lleguen reducidas (float32/int32)
+    measures = df[LEVELS + MEASURES].astype({c: 'int64' if c in POPULATION else 'float64' for c in MEASURES})
+    return measures.groupby(LEVELS, observed=True)[MEASURES].sum().sort_index()
+
+
+def _without_periodo(table, periodo):
+    # Filas de `table` de los demás PERIODO; sirve tanto para los rollups con MultiIndex
+    # como para el de solo PERIODO, que tiene un índice simple
+    return table[table.index.get_level_values('PERIODO') != periodo]
+
+
+def fold(base, df):
+    # Sumar un bloque de filas a una base del cubo ya acumulada (carga por bloques); el
+    # acumulado ocupa una fila por celda, sin importar cuántas filas se hayan leído
+    part = _cube_base(df)
+    if base is None:
+        return part
+    return pd.concat([base, part]).groupby(level=LEVELS, observed=True).sum().sort_index()
+
+
+class Cube:
+    def __init__(self, df, versions=None, base=None):
+        self.base = _cube_base(df) if base is None else base
+        self.periodos = sorted(int(p) for p in self.base.index.unique(level='PERIODO'))
+        # Versión de la partición de cada PERIODO con que se armó el cubo (ver sync)
+        self.versions = dict(versions or {})
+        self._rollups = {tuple(LEVELS): self.base}
+        self._slices = {}
+        # Reentrante: slice llama a rollup con el candado tomado
+        self._lock = threading.RLock()
+        # Rollups que usan los gráficos del menú "Inicio"
+        for keys in (['PERIODO'], ['DEPARTAMENTO'], ['PERIODO', 'DEPARTAMENTO']):
+            self.rollup(keys)
+
+    @classmethod
+    def from_chunks(cls, chunks, versions=None):
+        # Cubo armado bloque a bloque (bloques de un CSV, ver streaming.py, o las particiones
+        # por PERIODO) sin tener todas las filas en un solo DataFrame
+        base = None
+        for chunk in chunks:
+            base = fold(base, chunk)
+        if base is None:
+            raise ValueError("No rows to build the cube from.")
+        return cls(None, versions, base=base)
+
+    def rollup(self, keys):
+        # Totales agrupados por `keys` (subconjunto de LEVELS); se calculan una vez y se reutilizan
+        keys = _normalize_keys(keys)
+        rolled = self._rollups.get(keys)
+        if rolled is not None:
+            return rolled
+        # Se calcula y se agrega con el candado tomado: sync recorre estos diccionarios y los
+        # reemplaza, y una entrada agregada al anterior se perdería (o rompería el recorrido)
+        with self._lock:
+            if keys not in self._rollups:
+                if keys:
+                    rolled = self.base.groupby(level=list(keys), observed=True).sum()
+                else:
+                    rolled = self.base.sum().to_frame().T.astype(self.base.dtypes)
+                self._rollups[keys] = rolled
+            return self._rollups[keys]
+
+    def slice(self, keys, **filters):
+        # Totales por `keys` restringidos a valores fijos de otros niveles, p. ej.
+        # cube.slice('DEPARTAMENTO', PERIODO=2014); el resultado queda memorizado por filtro
+        keys = _normalize_keys(keys)
+        fixed = _normalize_keys(list(filters))
+        cache_key = (keys, tuple((k, filters[k]) for k in fixed))
+        rolled = self._slices.get(cache_key)
+        if rolled is not None:
+            return rolled
+        with self._lock:
+            if cache_key not in self._slices:
+                rolled = self.rollup(list(fixed) + list(keys))
+                if fixed:
+                    rolled = rolled.xs(tuple(filters[k] for k in fixed), level=list(fixed))
+                self._slices[cache_key] = rolled
+            return self._slices[cache_key]
+
+    def sync(self, partitions, versions):
+        # Alinear el cubo con las particiones por PERIODO ({periodo: DataFrame}) aplicando
+        # solo los PERIODO cuya versión cambió; devuelve los PERIODO actualizados. Cada PERIODO
+        # se registra al aplicarse: si uno falla, la siguiente llamada lo vuelve a intentar
+        with self._lock:
+            changed = sorted(p for p in set(self.versions) | set(versions)
+                             if self.versions.get(p) != versions.get(p))
+            for periodo in changed:
+                self._update_periodo(periodo, partitions.get(periodo))
+                applied = dict(self.versions)
+                if periodo in versions:
+                    applied[periodo] = versions[periodo]
+                else:
+                    applied.pop(periodo, None)
+                self.versions = applied
+            return changed
+
+    def _update_periodo(self, periodo, df_part):
+        # Reemplazar, agregar (o quitar si df_part es None) un PERIODO: los rollups por PERIODO
+        # se parchan con la parte nueva; los demás se suman si el PERIODO es nuevo y, si se
+        # reemplaza o se quita, se descartan para recalcularse desde la base al pedirlos
+        existed = periodo in self.periodos
+        part = _cube_base(df_part) if df_part is not None else None
+        base = _without_periodo(self.base, periodo) if existed else self.base
+        if part is not None:
+            base = pd.concat([base, part]).sort_index()
+        full = tuple(LEVELS)
+        rollups = {full: base}
+        for keys, rolled in self._rollups.items():
+            if keys == full:
+                continue
+            part_rolled = None
+            if part is not None:
+                part_rolled = part.groupby(level=list(keys), observed=True).sum() if keys else None
+            if 'PERIODO' in keys:
+                if existed:
+                    rolled = _without_periodo(rolled, periodo)
+                if part_rolled is not None:
+                    rolled = pd.concat([rolled, part_rolled]).sort_index()
+                rollups[keys] = rolled
+            elif not existed and part_rolled is not None:
+                rollups[keys] = rolled.add(part_rolled, fill_value=0).astype(rolled.dtypes)
+        # Las consultas memorizadas de otros PERIODO siguen valiendo
+        slices = {k: v for k, v in self._slices.items() if dict(k[1]).get('PERIODO', periodo) != periodo}
+        # Reemplazar las referencias de una vez; quien esté leyendo sigue con las anteriores
+        self.base, self._rollups, self._slices = base, rollups, slices
+        self.periodos = sorted(int(p) for p in base.index.unique(level='PERIODO'))
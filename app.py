@@ -1,9 +1,15 @@
 # Importar bibliotecas necesarias
-import pandas as pd
+import os
+import functools
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
 from streamlit_option_menu import option_menu
+# pandas, plotly y los módulos de datos (data_store, aggregates, geo, charts) se importan
+# recién al abrir una página de gráficos, así 'Acerca' y 'Nosotros' no pagan ese costo
+import figure_cache
+import instrumentation
+import warmup
+# Métricas de este rerun (tiempos, cachés, memoria y figuras); ver show_debug_panel
+instrumentation.begin_rerun()
 # Configuración de la página de Streamlit
 st.set_page_config(page_title="Residuos Municipales", page_icon="🚮", initial_sidebar_state="expanded", layout='wide')
 # Estilos en formato HTML para el texto
@@ -24,237 +30,350 @@ st.markdown(text_style, unsafe_allow_html=True)
 st.markdown("<h2 class='title_text'>Residuos Municipales (2014-2021)<h3>" , unsafe_allow_html=True)
 
 
-# Cargar el archivo CSV en un DataFrame
-@st.cache_data
-def load_data():
+# Almacén de los datos de residuos particionado por PERIODO (una instancia por proceso);
+# las particiones están en Arrow IPC en .cache/ y el CSV solo se vuelve a parsear si cambió
+@instrumentation.track_cache('load_store')
+@st.cache_resource
+def load_store():
+    instrumentation.record_miss('load_store')
+    import data_store
     file_path = 'residuos_municipales.csv'
-    df = pd.read_csv(file_path, encoding="latin1", delimiter=";", index_col=0)
-    df["PERIODO"] = df["PERIODO"].astype(int)
+    store = data_store.ResiduosStore(file_path)
+    return store
+
+# Cargar los datos de residuos en un DataFrame (uno por versión de los datos). Es de solo
+# lectura y está mapeado desde .cache/: cache_resource lo comparte entre sesiones sin la
+# copia que hace cache_data, y los demás procesos del host mapean las mismas páginas
+@instrumentation.track_cache('load_data')
+@st.cache_resource(max_entries=1)
+def load_data(version):
+    instrumentation.record_miss('load_data')
+    df = load_store().frame()
+    instrumentation.current().frame('load_data', df)
     return df
 
-@st.cache_data
+@instrumentation.track_cache('load_tb_ubigeos')
+@st.cache_resource
 def load_tb_ubigeos():
+    instrumentation.record_miss('load_tb_ubigeos')
+    import data_store
     ubigeos_ll = 'TB_UBIGEOS.csv'
-    dful = pd.read_csv(ubigeos_ll, encoding="latin1", delimiter=";", index_col=0)
+    dful = data_store.read_ubigeos(ubigeos_ll)
+    instrumentation.current().frame('load_tb_ubigeos', dful)
     return dful
 
-df = load_data()
-dful = load_tb_ubigeos()
-dfud = df
+# Cubo de agregados compartido por los gráficos (cache_resource: se construye una vez
+# por proceso y no se copia en cada rerun; los gráficos solo lo leen). Se arma partición por
+# partición, sin unir todo el histórico en un solo DataFrame
+@instrumentation.track_cache('load_cube')
+@st.cache_resource
+def load_cube():
+    instrumentation.record_miss('load_cube')
+    import aggregates
+    store = load_store()
+    cube = aggregates.Cube.from_chunks((store.partitions[p] for p in sorted(store.partitions)), store.versions)
+    return cube
 
-@st.cache_data
-def process_data(df):
-    # Group by DEPARTAMENTO and PERIODO and sum QRESIDUOS_MUN
-    df_grouped = df.groupby(['PERIODO', 'DEPARTAMENTO'])['QRESIDUOS_MUN'].sum().reset_index()
-    return df_grouped
+# Métricas derivadas (per cápita, crecimiento, participación, domiciliarios/no domiciliarios),
+# calculadas una vez por versión de los datos sobre el cubo
+@instrumentation.track_cache('load_metrics')
+@st.cache_resource(max_entries=1)
+def load_metrics(version):
+    instrumentation.record_miss('load_metrics')
+    import metrics
+    derived = metrics.DerivedMetrics(load_cube())
+    return derived
 
-# Función para generar el primer gráfico
-def do_chart1():
-    global df
-    sum_by_periodo = df.groupby("PERIODO")["QRESIDUOS_MUN"].sum().reset_index()
-    # Crear un gráfico de pastel (donut chart) utilizando plotly
-    pull_values = [0.1] + [0] * (len(sum_by_periodo) - 1)
-    fig = go.Figure()
-    # Resaltar el primer periodo (2014)
-    fig.add_trace(go.Pie(
-        labels=sum_by_periodo["PERIODO"],
-        values=sum_by_periodo["QRESIDUOS_MUN"],
-        texttemplate="%{label}<br>%{percent:.2%}",
-        hole=0.4,
-        showlegend=True,
-        hovertemplate="<b>Año</b>: %{label}<br>"
-                    "<b>Total</b>: %{value:.2f} Ton/Año<br>"
-                    "<b>Porcentaje</b>: %{percent:.2%}<br>"
-                    "<extra></extra>",
-        textinfo='percent+value',
-        # pull=[0.1] * len(sum_by_periodo),
-        pull=pull_values,
-        marker=dict(colors=px.colors.qualitative.Set3),
-        sort=False  # Desactivar el ordenamiento automático
-    ))
-    # Use `hole` to create a donut-like pie chart
-    fig.update_traces(hole=.4, hoverinfo="label+percent")
-    # Anotación central
-    fig.add_annotation(
-        text="RR.SS",
-        x=0.5,
-        y=0.5,
-        showarrow=False,
-        font=dict(size=20)
-    )
+# Motor de consultas (query.py) de la versión actual de los datos, con su caché de resultados
+@instrumentation.track_cache('load_query_engine')
+@st.cache_resource(max_entries=1)
+def load_query_engine(version):
+    instrumentation.record_miss('load_query_engine')
+    import query
+    engine = query.QueryEngine(load_cube(), lambda: load_data(version), load_metrics(version), version)
+    return engine
+
+# Incorporar los PERIODO ingresados con ingest.py desde el último rerun: solo se leen
+# las particiones nuevas y el cubo se actualiza solo en esos PERIODO. Se compara contra las
+# versiones del cubo y no contra lo que devolvió refresh(): si una sincronización falla, el
+# siguiente rerun la vuelve a intentar en lugar de quedarse con el cubo anterior
+def refresh_data():
+    store = load_store()
+    store.refresh()
+    cube = load_cube()
+    if cube.versions != store.versions:
+        cube.sync(store.partitions, store.versions)
+
+# Decorador para las acciones del menú que usan los datos: se cargan (o se refrescan) al
+# abrir la página, no al importar la aplicación
+def needs_data(action):
+    @functools.wraps(action)
+    def wrapper():
+        with instrumentation.stage('load'):
+            refresh_data()
+        action()
+    return wrapper
+
+# Índice jerárquico departamento -> provincia -> distrito para los filtros del cuarto gráfico
+@instrumentation.track_cache('load_ubigeo_index')
+@st.cache_resource(max_entries=1)
+def load_ubigeo_index(version):
+    instrumentation.record_miss('load_ubigeo_index')
+    import geo
+    index = geo.UbigeoIndex(load_data(version))
+    return index
+
+# Residuos unidos con las coordenadas de TB_UBIGEOS (se une una vez al cargar, no en cada rerun)
+@instrumentation.track_cache('load_geo_table')
+@st.cache_resource(max_entries=1)
+def load_geo_table(version):
+    instrumentation.record_miss('load_geo_table')
+    import data_store
+    import geo
+    # La tabla unida y las filas sin coordenadas se comparten como instantáneas mapeadas entre
+    # procesos; la unión se hace una sola vez aunque falten las dos
+    joined = []
+    def _join(i):
+        if not joined:
+            joined.extend(geo.join_ubigeos(load_data(version), load_tb_ubigeos()))
+        return joined[i]
+    snapshot_version = version + '-' + load_ubigeos_version()
+    table = data_store.shared_frame('geo', snapshot_version, lambda: _join(0))
+    unmatched = data_store.shared_frame('geo-unmatched', snapshot_version, lambda: _join(1))
+    geo_table = geo.GeoTable(None, table=table, unmatched=unmatched)
+    return geo_table
+
+# Caché de figuras compartida por todas las sesiones del proceso
+@st.cache_resource
+def load_figure_cache():
+    cache = figure_cache.FigureCache()
+    return cache
+
+@st.cache_resource
+def load_ubigeos_version():
+    import data_store
+    load_tb_ubigeos()
+    version = data_store.data_version('TB_UBIGEOS.csv')
+    return version
 
-    fig.update_layout(
-        title="Residuos municipales Ton/Año | 2014 - 2021",
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        ),
-        font=dict(family="Arial", size=12, color="black"),
-    )
+# Figuras pre-renderizadas con static_export.py (RSOLIDOS_STATIC_DIR, por defecto static/);
+# se revisa el manifiesto una vez por minuto por si se vuelve a exportar
+@st.cache_resource(ttl=60)
+def load_static_site():
+    import static_export
+    site = static_export.StaticSite()
+    return site
+
+# Versión de los datos en la clave de la caché de figuras: la de la partición del PERIODO
+# si el gráfico depende de uno solo, o la de todo el conjunto
+def data_version(periodo=None):
+    store = load_store()
+    version = store.versions[periodo] if periodo is not None else store.version
+    return version + '-' + load_ubigeos_version()
+
+# Devuelve la figura del gráfico `chart_id` con `params` desde la caché, construyéndola solo si falta
+# (o leyéndola de la exportación estática si tiene una variante de la misma versión de los datos)
+def cached_figure(chart_id, params, build, version=None):
+    version = version or data_version()
+    built = []
+    def _load():
+        import plotly.io as pio
+        fig_json = load_static_site().figure_json(chart_id, params, version)
+        if fig_json is not None:
+            # El JSON exportado se convierte en figura una sola vez, al entrar a la caché
+            return pio.from_json(fig_json), len(fig_json)
+        built.append(chart_id)
+        fig = build()
+        return fig, len(fig.to_json())
+    with instrumentation.stage('figure:' + chart_id):
+        fig, nbytes = load_figure_cache().get_or_load(chart_id, params, version, _load)
+    instrumentation.current().figure(chart_id, nbytes, hit=not built)
+    return fig
+
+# Enviar la figura al navegador (serialización y envío de Streamlit, medido aparte)
+def plotly_chart(fig, **kwargs):
+    with instrumentation.stage('plotly_chart'):
+        st.plotly_chart(fig, **kwargs)
+
+# Tablas paginadas (tables.py): cada tabla se arma una vez por consulta y versión de los datos,
+# y al navegador solo viaja la página visible con las columnas elegidas
+@instrumentation.track_cache('load_table')
+@st.cache_resource(max_entries=64)
+def load_table(name, params, version, _build):
+    instrumentation.record_miss('load_table')
+    import tables
+    table = tables.Table(_build())
+    return table
+
+# Descarga de la tabla completa: se escribe por lotes en .cache/exports recién al pulsar el
+# botón (en otro hilo) y se reutiliza mientras no cambien los datos
+def table_export(table, name, params, version, fmt, options):
+    def _export():
+        import data_store
+        import tables
+        path = tables.export_path(os.path.join(data_store.CACHE_DIR, 'exports'), version, name, fmt,
+                                  params=params, **options)
+        if not os.path.exists(path):
+            table.write(path, fmt, **options)
+        with open(path, 'rb') as fh:
+            return fh.read()
+    return _export
+
+def show_table(name, params, build):
+    import tables
+    version = load_store().version
+    params = tuple(sorted(params.items()))
+    table = load_table(name, params, version, build)
+    col1, col2, col3, col4, col5 = st.columns([4, 2, 1, 1, 1])
+    with col1:
+        columns = st.multiselect('Columnas', table.columns, default=table.columns, key=name + '-columns')
+    with col2:
+        sort_by = st.selectbox('Ordenar por', [None] + table.columns, key=name + '-sort',
+                               format_func=lambda c: '(orden original)' if c is None else c)
+    with col3:
+        descending = st.checkbox('Descendente', key=name + '-descending')
+    with col4:
+        page_size = st.selectbox('Filas por página', tables.PAGE_SIZES, key=name + '-page-size')
+    page_count = table.page_count(page_size)
+    with col5:
+        # La clave cambia con el número de páginas para volver a la primera si ya no existe
+        page = st.number_input('Página', min_value=1, max_value=page_count, value=1, step=1,
+                               key=f'{name}-page-{page_size}-{page_count}')
+    options = {'sort_by': sort_by, 'ascending': not descending, 'columns': tuple(columns or table.columns)}
+    with instrumentation.stage('table:' + name):
+        window = table.window(page, page_size, **options)
+    st.dataframe(window, use_container_width=True)
+    first = (page - 1) * page_size
+    st.caption(f"Filas {min(first + 1, len(table))}-{first + len(window)} de {len(table)}")
+    for col, fmt in zip(st.columns(len(tables.EXPORT_FORMATS)), tables.EXPORT_FORMATS):
+        with col:
+            st.download_button(f'Descargar {fmt.upper()}', table_export(table, name, params, version, fmt, options),
+                               file_name=f'{name}.{fmt}', mime=tables.EXPORT_FORMATS[fmt], key=f'{name}-download-{fmt}')
 
-    st.plotly_chart(fig, use_container_width=True)
+# Función para generar el primer gráfico
+@needs_data
+def do_chart1():
+    import charts
+    fig = cached_figure('chart1', {}, lambda: charts.build_chart1(load_cube()))
+    plotly_chart(fig, use_container_width=True)
 
     st.markdown("*Gráfica 1: El gráfico representa la proporción expresada en porcentajes de la cantidad de residuos sólidos municipales por año*")
     st.info('En el gráfico se presenta una comparación detallada de la cantidad de residuos sólidos municipales registrados entre 2014 y 2021, junto con su proporción respecto al total acumulado en dicho período. La visualización destaca una tendencia ascendente en el porcentaje de residuos municipales, evidenciando un incremento constante en cada intervalo analizado. ', icon="😀")
 # Función para generar el segundo gráfico
+@needs_data
 def do_chart2():
-    sum_residuos_urbanos = df.groupby("DEPARTAMENTO")["QRESIDUOS_MUN"].sum().reset_index()
-    sum_residuos_urbanos.rename(columns={"QRESIDUOS_MUN": "Residuos Municipales"}, inplace=True)
-    fig = px.scatter(sum_residuos_urbanos, x="DEPARTAMENTO", y="Residuos Municipales",
-                    size="Residuos Municipales", color="DEPARTAMENTO",
-                    hover_name="DEPARTAMENTO", title="Residuos Municipales Ton/Año por Departamento",
-                    labels={"Residuos Domiciliarios": "Residuos Municipales", "DEPARTAMENTO": "Departamento"},
-                    size_max=60,
-                    color_discrete_sequence=px.colors.qualitative.Set3)
-    fig.update_yaxes(title_text="Residuos Municipales 2014 - 2021")
-    fig.update_layout(xaxis_tickangle=-45)
-    fig.update_layout(
-        xaxis=dict(title='Departamento'),
-        yaxis=dict(title='Residuos Municipales 2014 - 2021'),
-        template="plotly_dark",
-        font=dict(family="Arial", size=12, color="white"),
-    )
-    st.plotly_chart(fig)
+    import charts
+    fig = cached_figure('chart2', {}, lambda: charts.build_chart2(load_cube()))
+    plotly_chart(fig)
     st.markdown("*Gráfica 2: El gráfico representa los residuos Municipales por departamento expresada en millones de toneladas*")
     st.warning('El gráfico revela que Lima, la capital y la ciudad más urbanizada y poblada de Perú, generó la mayor cantidad de residuos municipales entre 2014 y 2021. Este hecho resalta su significativa producción de residuos sólidos municipales. ', icon="😀")
 # Función para generar el tercer gráfico
+@needs_data
 def do_chart3():
-    # df_grouped = process_data(df)
+    import charts
+    cube = load_cube()
     # Crear el sidebar para el filtro de PERIODO
-    periodos = df['PERIODO'].unique()
+    periodos = cube.periodos
     selected_periodo = st.selectbox('Selecciona un PERIODO:', periodos)
-    # Filtrar el dataframe por el PERIODO seleccionado
-    df_filtered = df[df['PERIODO'] == selected_periodo]
-    # Agrupar por DEPARTAMENTO y sumar QRESIDUOS_MUN
-    df_grouped = df_filtered.groupby('DEPARTAMENTO')['QRESIDUOS_MUN'].sum().reset_index()
-
-    # Plot with Plotly
-    fig = px.line(df_grouped, x='DEPARTAMENTO', y='QRESIDUOS_MUN', title='Residuos por departamento ')
-
-    # Add circular markers and customize the style
-    fig.update_traces(
-        mode='lines+markers',
-        marker=dict(symbol='circle', size=10, color='red'),
-        line=dict(color='blue', width=2)
-    )
-
-    # Update layout for advanced styling
-    fig.update_layout(
-        title=dict(
-            text='Residuos por departamento - '+str(selected_periodo),
-            font=dict(size=20, color='darkblue'),
-            # x=0.5  # Center the title
-        ),
-        xaxis=dict(
-            title='Departamento',
-            titlefont=dict(size=16, color='darkblue'),
-            tickfont=dict(size=14, color='black'),
-            showgrid=True,
-            gridcolor='lightgrey'
-        ),
-        yaxis=dict(
-            title='Cantidad de Residuos',
-            titlefont=dict(size=16, color='darkblue'),
-            tickfont=dict(size=14, color='black'),
-            showgrid=True,
-            gridcolor='lightgrey'
-        ),
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        hovermode='x unified'
-    )
-    st.plotly_chart(fig)
-    df_grouped.index = df_grouped.index + 1
-    st.write(df_grouped)
+    fig = cached_figure('chart3', {'periodo': selected_periodo}, lambda: charts.build_chart3(cube, selected_periodo),
+                        data_version(selected_periodo))
+    plotly_chart(fig)
+    def _table():
+        df_grouped = charts.chart3_query(load_query_engine(load_store().version), selected_periodo)
+        df_grouped.index = df_grouped.index + 1
+        return df_grouped
+    show_table('chart3', {'periodo': selected_periodo}, _table)
 
     # # Mostrar el gráfico en Streamlit
     # st.write(f"QRESIDUOS_MUN by DEPARTAMENTO for PERIODO {selected_periodo}")
     st.markdown("*Gráfica 3: La gráfica muestra la cantidad de residuos sólidos municipales por departamento en el periodo seleccionado.*")
     st.info('El gráfico lineal muestra la evolución de la cantidad de residuos municipales generados en distintos períodos. Destaca notablemente la ciudad de Lima, que consistentemente ocupa el primer lugar en generación de residuos municipales en cada uno de los períodos analizados.', icon="🔎")
 # Función para generar el cuarto gráfico    
+@needs_data
 def do_chart4():
-    # Extract the required columns
-    ubigeos_distrito_selected = dfud[['UBIGEO','PERIODO', 'DEPARTAMENTO', 'PROVINCIA','DISTRITO','GPC_DOM', 'QRESIDUOS_DOM', 'QRESIDUOS_NO_DOM', 'QRESIDUOS_MUN']]
-
-    ubigeos_ll_selected = dful[['ubigeo_inei', 'latitud', 'longitud']]
-
-    # Reset index to avoid showing the index column
-    ubigeos_distrito_selected.reset_index(drop=True, inplace=True)
-    ubigeos_ll_selected.reset_index(drop=True, inplace=True)
-    ubigeos_ll_selected.index = range(1, len(ubigeos_ll_selected) + 1)
-    ubigeos_distrito_selected.index = range(1, len(ubigeos_distrito_selected) + 1)
+    import charts
+    version = load_store().version
+    index = load_ubigeo_index(version)
+    geo_table = load_geo_table(version)
     col1, col2, col3 = st.columns(3)
-    distrito_filtrado = ubigeos_distrito_selected
     with col1:
     # Filter inputs
-        departamento = st.selectbox('Seleccione Departamento', ubigeos_distrito_selected['DEPARTAMENTO'].unique())
-        distrito_filtrado = distrito_filtrado[distrito_filtrado['DEPARTAMENTO'] == departamento]
+        departamento = st.selectbox('Seleccione Departamento', index.departamentos())
     with col2:
-        provincia = st.selectbox('Seleccione Provincia', distrito_filtrado['PROVINCIA'].unique())
-        distrito_filtrado = distrito_filtrado[distrito_filtrado['PROVINCIA'] == provincia]
+        provincia = st.selectbox('Seleccione Provincia', index.provincias(departamento))
     with col3:
-        pass
-        distrito = st.selectbox('Seleccione Distrito', distrito_filtrado['DISTRITO'].unique())
-        distrito_filtrado = distrito_filtrado[distrito_filtrado['DISTRITO'] == distrito]
-        
-    # Sum QRESIDUOS_MUN
-    distrito_filtrado = distrito_filtrado.assign(QRESIDUOS_MUN_SUM=distrito_filtrado['QRESIDUOS_MUN'].sum())
-    # Merge the dataframes on UBIGEO and ubigeo_reniec
-    merged_df = pd.merge(distrito_filtrado, ubigeos_ll_selected, left_on='UBIGEO', right_on='ubigeo_inei')
-    st.write(merged_df)
+        distrito = st.selectbox('Seleccione Distrito', index.distritos(departamento, provincia))
+    ubigeo = index.ubigeo(departamento, provincia, distrito)
+    merged_df = charts.chart4_table(geo_table, ubigeo)
+    show_table('chart4', {'ubigeo': ubigeo}, lambda: merged_df)
     # Plotting
     if not merged_df.empty:
-        fig = px.scatter_mapbox(
-            merged_df,
-            hover_name="DISTRITO",
-            hover_data=["DEPARTAMENTO", "PROVINCIA", "QRESIDUOS_MUN_SUM"],
-            title="Total de Residuos por Distrito del 2014 al 2021",
-            lat="latitud",
-            lon="longitud",
-            zoom=11,
-            height=400,
-            color="QRESIDUOS_MUN_SUM",
-            size="QRESIDUOS_MUN_SUM",
-            # color_continuous_scale="Viridis",  # Cute color scale
-            # opacity=0.7,  # Cute opacity level
-            labels={"QRESIDUOS_MUN_SUM": "Total Residuos "},
-            center={"lat": merged_df["latitud"].mean(), "lon": merged_df["longitud"].mean()},
-        )
-        fig.update_layout(mapbox_style="open-street-map")
+        fig = cached_figure('chart4_map', {'ubigeo': ubigeo}, lambda: charts.build_chart4_map(merged_df))
         # Customize map layout
-        st.plotly_chart(fig)
+        plotly_chart(fig)
         st.info('El gráfico Scatter Mapbox muestra la cantidad total de residuos municipales generados en el distrito seleccionado durante el período 2014-2021. Esta visualización proporciona una representación geoespacial precisa de los niveles de generación de residuos en dicho distrito.', icon="🔎")
         # Plot bar chart by PERIODO
-        fig = px.bar(
-        distrito_filtrado,
-        x='PERIODO',
-        y=['QRESIDUOS_DOM', 'QRESIDUOS_NO_DOM'],
-        barmode='group',
-        title='QRESIDUOS_DOM y QRESIDUOS_NO_DOM por PERIODO',
-        color_discrete_map={'QRESIDUOS_DOM': 'green', 'QRESIDUOS_NO_DOM': 'gray'}
-        )
-        # Customize hover template
-        fig.update_traces(
-            hovertemplate='<b style="color:red;">Periodo</b>: %{x}<br><b style="color:blue;">Cantidad</b>: %{y:.2f} <b style="color:black;">Ton/Año</b>'
-        )
-
-        fig.update_layout(
-        xaxis_title='Periodo',
-        yaxis_title='Cantidad',
-        yaxis_tickformat=',.2f',  # Format y-axis ticks as whole numbers
-        font=dict(size=10),  # Set font size
-        plot_bgcolor='rgba(0,0,0,0)', # Transparent background
-        legend_title_text='TIPO DE RESIDUOS'
-    )
-
-        st.plotly_chart(fig)
+        fig = cached_figure('chart4_bar', {'ubigeo': ubigeo}, lambda: charts.build_chart4_bar(merged_df))
+        plotly_chart(fig)
         st.info('La gráfica de barras agrupadas presenta una comparación detallada de la cantidad de residuos domiciliarios y no domiciliarios generados en el distrito seleccionado durante el período 2014-2021. Cada barra del gráfico está segmentada por año, proporcionando una visión clara de la evolución temporal de ambos tipos de residuos. Esta representación permite identificar patrones y tendencias en la generación de residuos, facilitando el análisis estadístico y la toma de decisiones informadas sobre la gestión de residuos en el distrito.', icon="🔎")
     else:
         st.write("Datos no encontrado.")
 
+# Función para generar el quinto gráfico (mapa nacional de distritos)
+@needs_data
+def do_chart5():
+    import charts
+    import geo
+    geo_table = load_geo_table(load_store().version)
+    col1, col2 = st.columns(2)
+    with col1:
+        selected_periodo = st.selectbox('Selecciona un PERIODO:', load_cube().periodos)
+    with col2:
+        zoom = st.select_slider('Nivel de detalle del mapa', options=list(geo.ZOOM_CELL_DEGREES), value=5)
+    fig = cached_figure('chart5', {'periodo': selected_periodo, 'zoom': zoom},
+                        lambda: charts.build_chart5(geo_table, selected_periodo, zoom), data_version(selected_periodo))
+    plotly_chart(fig, use_container_width=True)
+    st.markdown("*Gráfica 5: El mapa muestra los residuos sólidos municipales de todos los distritos del Perú en el periodo seleccionado, agrupados según el nivel de detalle.*")
+    st.info('Con poco detalle, cada círculo agrupa los distritos cercanos y muestra su total y el distrito que más residuos genera; con el máximo detalle, cada círculo es un distrito.', icon="🗺️")
+
+# Precalentamiento de la réplica (ver warmup.py): carga en un hilo de fondo lo que usa cada
+# do_chart* y las figuras de sus selecciones por defecto, para que el primer usuario no lo pague
+def warm_up_steps():
+    def _figures():
+        import charts
+        cube = load_cube()
+        periodo = cube.periodos[0]
+        cached_figure('chart1', {}, lambda: charts.build_chart1(cube))
+        cached_figure('chart2', {}, lambda: charts.build_chart2(cube))
+        cached_figure('chart3', {'periodo': periodo}, lambda: charts.build_chart3(cube, periodo), data_version(periodo))
+        charts.chart3_query(load_query_engine(load_store().version), periodo)
+        index = load_ubigeo_index(load_store().version)
+        departamento = index.departamentos()[0]
+        provincia = index.provincias(departamento)[0]
+        ubigeo = index.ubigeo(departamento, provincia, index.distritos(departamento, provincia)[0])
+        merged_df = charts.chart4_table(load_geo_table(load_store().version), ubigeo)
+        cached_figure('chart4_map', {'ubigeo': ubigeo}, lambda: charts.build_chart4_map(merged_df))
+        cached_figure('chart4_bar', {'ubigeo': ubigeo}, lambda: charts.build_chart4_bar(merged_df))
+        geo_table = load_geo_table(load_store().version)
+        cached_figure('chart5', {'periodo': periodo, 'zoom': 5},
+                      lambda: charts.build_chart5(geo_table, periodo, 5), data_version(periodo))
+    return [
+        ('load_data', lambda: load_data(load_store().version)),
+        ('load_tb_ubigeos', load_tb_ubigeos),
+        ('load_cube', load_cube),
+        ('load_metrics', lambda: load_metrics(load_store().version)),
+        ('load_query_engine', lambda: load_query_engine(load_store().version)),
+        ('load_ubigeo_index', lambda: load_ubigeo_index(load_store().version)),
+        ('load_geo_table', lambda: load_geo_table(load_store().version)),
+        ('figures', _figures),
+    ]
+
+# Se lanza una sola vez por proceso, en el primer rerun de cualquier sesión, y solo si está
+# habilitado (ver warmup.ENABLED); si no, cada página carga lo suyo al abrirse
+@st.cache_resource
+def start_warmup():
+    return warmup.start(warm_up_steps())
+
 # Función para mostrar información sobre el proyecto
 def do_acerca():
     st.image('basura.jpg', caption="Basura en la playa", use_column_width=True)
@@ -360,7 +479,8 @@ menu = {
                     'Gráfico 1' : {'action': do_chart1, 'item_icon': 'pie-chart-fill', 'submenu': None},  # Elemento 1 del submenú
                     'Gráfico 2' : {'action': do_chart2, 'item_icon': 'bar-chart-fill', 'submenu': None},  # Elemento 2 del submenú
                     'Gráfico 3' : {'action': do_chart3, 'item_icon': 'bar-chart-line', 'submenu': None},  # Elemento 3 del submenú
-                    'Gráfico 4' : {'action': do_chart4, 'item_icon': 'bar-chart-line-fill', 'submenu': None} # Elemento 4 del submenú
+                    'Gráfico 4' : {'action': do_chart4, 'item_icon': 'bar-chart-line-fill', 'submenu': None}, # Elemento 4 del submenú
+                    'Gráfico 5' : {'action': do_chart5, 'item_icon': 'map', 'submenu': None} # Elemento 5 del submenú
                 },
                 'menu_icon': None,  # Ícono asociado al submenú (None indica sin ícono)
                 'default_index': 0,  # Índice predeterminado al cargar el submenú
@@ -441,26 +561,53 @@ def show_menu(menu):
     if menu_selection == 'Inicio':
         if menu['items'][menu_selection]['submenu']:
             pass
+    instrumentation.current().page.append(menu_selection)
     # Lógica para mostrar submenú si está presente
     if menu['items'][menu_selection]['submenu']:
         show_menu(menu['items'][menu_selection]['submenu'])
     # Lógica para ejecutar la acción asociada si está presente
     if menu['items'][menu_selection]['action']:
-        menu['items'][menu_selection]['action']()
+        with instrumentation.stage('action:' + menu_selection):
+            menu['items'][menu_selection]['action']()
 # Mostrar una imagen en la barra lateral usando Streamlit
 st.sidebar.image('https://www.precayetanovirtual.pe/moodle/pluginfile.php/1/theme_mb2nl/loadinglogo/1692369360/logo-cayetano.png', use_column_width=True)
-# Llamar a la función para mostrar el menú interactivo
-show_menu(menu)
-# Crear tres columnas en la barra lateral (1:8:1 ratio)
-st.sidebar.image('logo.jpeg', use_column_width=True)
-# col1, col2, col3 = st.sidebar.columns([2, 4, 2])
-# # Espacio en blanco en la primera y tercera columna para centrar la imagen
-# with col1:
-#     st.write("")
-# # Mostrar una imagen en la segunda columna, probablemente un avatar o logotipo
-# with col2:
-# # Espacio en blanco en la tercera columna para centrar la imagen
-# with col3:
-#     st.write("")
-# # Mostrar un texto en la barra lateral después de las columnas y agregar efecto de nieve
-st.sidebar.text("Ing. ambiental - 2024")  
+# Precalentar las cachés en segundo plano mientras se muestra la página (si está habilitado)
+if warmup.ENABLED:
+    start_warmup()
+# Panel de depuración (abrir con ?debug=1 o RSOLIDOS_DEBUG=1)
+def show_debug_panel():
+    metrics = instrumentation.current().as_dict()
+    with st.sidebar.expander('Depuración: métricas del rerun', expanded=True):
+        st.write(f"**Página**: {metrics['page']}  \n**Tiempo total**: {metrics['seconds'] * 1000:.1f} ms")
+        st.dataframe([{'etapa': s['stage'], 'ms': round(s['seconds'] * 1000, 2), 'Δ RSS (MB)': s['rss_delta_mb']}
+                      for s in metrics['stages']], use_container_width=True)
+        st.write('**Cachés**', metrics['cache'])
+        st.write('**Caché de figuras**', load_figure_cache().stats())
+        st.write('**Precalentamiento**', warmup.state.status())
+        if metrics['frames']:
+            st.write('**DataFrames cargados**', metrics['frames'])
+        if metrics['figures']:
+            st.write('**Figuras**', metrics['figures'])
+
+# Cerrar las métricas del rerun aunque se corte a la mitad (nuevo rerun, st.stop() o error)
+try:
+    # Llamar a la función para mostrar el menú interactivo
+    with instrumentation.stage('show_menu'):
+        show_menu(menu)
+    # Crear tres columnas en la barra lateral (1:8:1 ratio)
+    st.sidebar.image('logo.jpeg', use_column_width=True)
+    # col1, col2, col3 = st.sidebar.columns([2, 4, 2])
+    # # Espacio en blanco en la primera y tercera columna para centrar la imagen
+    # with col1:
+    #     st.write("")
+    # # Mostrar una imagen en la segunda columna, probablemente un avatar o logotipo
+    # with col2:
+    # # Espacio en blanco en la tercera columna para centrar la imagen
+    # with col3:
+    #     st.write("")
+    # # Mostrar un texto en la barra lateral después de las columnas y agregar efecto de nieve
+    st.sidebar.text("Ing. ambiental - 2024")  
+    if st.query_params.get('debug') == '1' or os.environ.get('RSOLIDOS_DEBUG') == '1':
+        show_debug_panel()
+finally:
+    instrumentation.end_rerun()
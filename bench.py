@@ -0,0 +1,214 @@
+# Benchmarks de las rutas de datos y de los gráficos de app.py, sin servidor de Streamlit:
+#   python bench.py --scales 1 10 100 --output bench.json
+#   python bench.py --scales 1 10 --compare bench.json
+# Cada escala multiplica las filas de residuos_municipales.csv (10x, 100x, 1000x) generando
+# PERIODO sintéticos; los resultados en JSON se pueden comparar entre commits con --compare.
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import aggregates
+import charts
+import data_store
+import geo
+import streaming
+
+RESIDUOS_CSV = 'residuos_municipales.csv'
+UBIGEOS_CSV = 'TB_UBIGEOS.csv'
+QUANTITY_COLUMNS = ['QRESIDUOS_DOM', 'QRESIDUOS_NO_DOM']
+# Un benchmark es regresión si tarda más que esta proporción del resultado de referencia
+REGRESSION_RATIO = 1.2
+
+
+def timed(fn, repeat):
+    # Ejecuta `fn` `repeat` veces; devuelve (estadísticas en segundos, último resultado)
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': statistics.median(times), 'repeat': repeat}, result
+
+
+def write_synthetic_csv(csv_path, factor, out_path, seed=0):
+    # CSV con `factor` copias de los datos: cada copia corre los PERIODO a un bloque de años
+    # nuevo y altera los residuos +-10%; se escribe copia por copia sin juntarlas en memoria
+    raw = pd.read_csv(csv_path, encoding="latin1", delimiter=";", dtype={'UBIGEO': str})
+    rng = np.random.default_rng(seed)
+    span = int(raw['PERIODO'].max() - raw['PERIODO'].min() + 1)
+    for k in range(factor):
+        part = raw.copy()
+        part['PERIODO'] = part['PERIODO'] + span * k
+        part['N_SEC'] = part['N_SEC'] + len(raw) * k
+        jitter = rng.uniform(0.9, 1.1, len(part))
+        for column in QUANTITY_COLUMNS:
+            part[column] = (part[column] * jitter).round(2)
+        part['QRESIDUOS_MUN'] = part['QRESIDUOS_DOM'] + part['QRESIDUOS_NO_DOM']
+        part.to_csv(out_path, sep=';', index=False, encoding='latin1', mode='w' if k == 0 else 'a',
+                    header=k == 0, float_format='%.2f')
+    return out_path
+
+
+def bench_loading(csv_path, workdir, repeat):
+    results = {}
+    results['read_csv_raw'], _ = timed(
+        lambda: pd.read_csv(csv_path, encoding="latin1", delimiter=";", index_col=0), repeat)
+    results['read_csv_typed'], _ = timed(lambda: data_store.read_residuos_csv(csv_path), repeat)
+
+    # load_data en frío: convierte el CSV a particiones Arrow en un directorio vacío
+    def _cold():
+        data_store.set_cache_dir(tempfile.mkdtemp(dir=workdir))
+        return data_store.ResiduosStore(csv_path).frame()
+    results['load_data_cold'], _ = timed(_cold, repeat)
+    results['load_data_warm'], df = timed(lambda: data_store.ResiduosStore(csv_path).frame(), repeat)
+    results['load_tb_ubigeos_csv'], _ = timed(lambda: data_store.read_ubigeos_csv(UBIGEOS_CSV), repeat)
+    results['load_tb_ubigeos'], dful = timed(lambda: data_store.read_ubigeos(UBIGEOS_CSV), repeat)
+    results['stream_cube'], _ = timed(lambda: streaming.stream_cube(csv_path)[0], repeat)
+    return results, df, dful
+
+
+def bench_aggregates(df, dful, repeat):
+    results = {}
+    periodo = int(df['PERIODO'].iloc[0])
+    # Agrupaciones tal como las hacía cada do_chart* sobre el DataFrame completo
+    results['chart1_groupby_raw'], _ = timed(
+        lambda: df.groupby("PERIODO")["QRESIDUOS_MUN"].sum().reset_index(), repeat)
+    results['chart2_groupby_raw'], _ = timed(
+        lambda: df.groupby("DEPARTAMENTO", observed=True)["QRESIDUOS_MUN"].sum().reset_index(), repeat)
+    results['chart3_groupby_raw'], _ = timed(
+        lambda: df[df['PERIODO'] == periodo].groupby('DEPARTAMENTO', observed=True)['QRESIDUOS_MUN'].sum().reset_index(),
+        repeat)
+    # Las mismas consultas respondidas por el cubo precalculado
+    results['cube_build'], cube = timed(lambda: aggregates.Cube(df), repeat)
+    results['chart1_cube'], _ = timed(lambda: cube.rollup('PERIODO')['QRESIDUOS_MUN'].reset_index(), repeat)
+    results['chart2_cube'], _ = timed(lambda: cube.rollup('DEPARTAMENTO')[['QRESIDUOS_MUN']].reset_index(), repeat)
+    results['chart3_cube'], _ = timed(lambda: charts.chart3_table(cube, periodo), repeat)
+    return results, cube
+
+
+def bench_chart4(df, dful, repeat):
+    results = {}
+    results['ubigeo_index_build'], index = timed(lambda: geo.UbigeoIndex(df), repeat)
+    results['geo_table_build'], geo_table = timed(lambda: geo.GeoTable(df, dful), repeat)
+    departamento = index.departamentos()[0]
+    provincia = index.provincias(departamento)[0]
+    distrito = index.distritos(departamento, provincia)[0]
+
+    # Filtro por máscaras y pd.merge con TB_UBIGEOS en cada rerun, como antes del índice
+    def _filter_merge_raw():
+        selected = df[df['DEPARTAMENTO'] == departamento]
+        selected = selected[selected['PROVINCIA'] == provincia]
+        selected = selected[selected['DISTRITO'] == distrito]
+        return pd.merge(selected, dful[['ubigeo_inei', 'latitud', 'longitud']], left_on='UBIGEO', right_on='ubigeo_inei')
+    results['chart4_filter_merge_raw'], _ = timed(_filter_merge_raw, repeat)
+    results['chart4_lookup'], merged_df = timed(
+        lambda: charts.chart4_table(geo_table, index.ubigeo(departamento, provincia, distrito)), repeat)
+    return results, geo_table, merged_df
+
+
+def bench_figures(cube, geo_table, merged_df, repeat):
+    results = {}
+    periodo = cube.periodos[0]
+    builders = {
+        'chart1': lambda: charts.build_chart1(cube),
+        'chart2': lambda: charts.build_chart2(cube),
+        'chart3': lambda: charts.build_chart3(cube, periodo),
+        'chart4_map': lambda: charts.build_chart4_map(merged_df),
+        'chart4_bar': lambda: charts.build_chart4_bar(merged_df),
+        'chart5': lambda: charts.build_chart5(geo_table, periodo, 5),
+    }
+    for chart_id, build in builders.items():
+        results[f'{chart_id}_figure_build'], fig = timed(build, repeat)
+        results[f'{chart_id}_figure_json'], fig_json = timed(fig.to_json, repeat)
+        results[f'{chart_id}_figure_bytes'] = len(fig_json)
+    return results
+
+
+def run_scale(factor, workdir, repeat):
+    csv_path = RESIDUOS_CSV
+    if factor != 1:
+        csv_path = write_synthetic_csv(RESIDUOS_CSV, factor, os.path.join(workdir, f'residuos_x{factor}.csv'))
+    results, df, dful = bench_loading(csv_path, workdir, repeat)
+    aggregate_results, cube = bench_aggregates(df, dful, repeat)
+    results.update(aggregate_results)
+    chart4_results, geo_table, merged_df = bench_chart4(df, dful, repeat)
+    results.update(chart4_results)
+    results.update(bench_figures(cube, geo_table, merged_df, repeat))
+    return {'factor': factor, 'rows': len(df), 'csv_mb': round(os.path.getsize(csv_path) / (1024 * 1024), 2),
+            'timings': results}
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def compare(current, baseline, threshold=REGRESSION_RATIO):
+    # Tabla de mediana actual / mediana de referencia por benchmark; marca las regresiones
+    lines = []
+    regressions = 0
+    for scale, result in current['results'].items():
+        base = baseline['results'].get(scale)
+        if base is None:
+            continue
+        for name, stats in result['timings'].items():
+            base_stats = base['timings'].get(name)
+            if not isinstance(stats, dict) or not isinstance(base_stats, dict) or not base_stats['median']:
+                continue
+            ratio = stats['median'] / base_stats['median']
+            flag = ' REGRESSION' if ratio > threshold else ''
+            regressions += bool(flag)
+            lines.append(f"{scale:>6} {name:<28} {base_stats['median'] * 1000:10.2f} ms "
+                         f"-> {stats['median'] * 1000:10.2f} ms  x{ratio:5.2f}{flag}")
+    return '\n'.join(lines), regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de carga, agregación y gráficos del dashboard")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100],
+                        help="multiplicadores de filas (p. ej. 1 10 100 1000)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="archivo JSON donde guardar los resultados")
+    parser.add_argument('--compare', help="JSON de una corrida anterior contra el cual comparar")
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+        },
+        'results': {},
+    }
+    with tempfile.TemporaryDirectory(prefix='rsolidos-bench-') as workdir:
+        for factor in args.scales:
+            report['results'][f'{factor}x'] = run_scale(factor, workdir, args.repeat)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            fh.write(output)
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as fh:
+            table, regressions = compare(report, json.load(fh))
+        print(table)
+        print(f"{regressions} regression(s) above x{REGRESSION_RATIO}")
+
+
+if __name__ == '__main__':
+    main()
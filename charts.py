@@ -0,0 +1,223 @@
+# Construcción de las figuras de Plotly de cada gráfico (sin dependencias de Streamlit)
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Columnas del distrito que se muestran en el cuarto gráfico
+DISTRITO_COLUMNS = ['PERIODO', 'DEPARTAMENTO', 'PROVINCIA','DISTRITO','GPC_DOM', 'QRESIDUOS_DOM', 'QRESIDUOS_NO_DOM', 'QRESIDUOS_MUN']
+GEO_TABLE_COLUMNS = ['QRESIDUOS_MUN_SUM', 'latitud', 'longitud']
+
+
+# Primer gráfico: proporción de residuos municipales por año
+def build_chart1(cube):
+    sum_by_periodo = cube.rollup("PERIODO")["QRESIDUOS_MUN"].reset_index()
+    # Crear un gráfico de pastel (donut chart) utilizando plotly
+    pull_values = [0.1] + [0] * (len(sum_by_periodo) - 1)
+    fig = go.Figure()
+    # Resaltar el primer periodo (2014)
+    fig.add_trace(go.Pie(
+        labels=sum_by_periodo["PERIODO"],
+        values=sum_by_periodo["QRESIDUOS_MUN"],
+        texttemplate="%{label}<br>%{percent:.2%}",
+        hole=0.4,
+        showlegend=True,
+        hovertemplate="<b>Año</b>: %{label}<br>"
+                    "<b>Total</b>: %{value:.2f} Ton/Año<br>"
+                    "<b>Porcentaje</b>: %{percent:.2%}<br>"
+                    "<extra></extra>",
+        textinfo='percent+value',
+        # pull=[0.1] * len(sum_by_periodo),
+        pull=pull_values,
+        marker=dict(colors=px.colors.qualitative.Set3),
+        sort=False  # Desactivar el ordenamiento automático
+    ))
+    # Use `hole` to create a donut-like pie chart
+    fig.update_traces(hole=.4, hoverinfo="label+percent")
+    # Anotación central
+    fig.add_annotation(
+        text="RR.SS",
+        x=0.5,
+        y=0.5,
+        showarrow=False,
+        font=dict(size=20)
+    )
+
+    fig.update_layout(
+        title="Residuos municipales Ton/Año | 2014 - 2021",
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        ),
+        font=dict(family="Arial", size=12, color="black"),
+    )
+    return fig
+
+
+# Segundo gráfico: residuos municipales por departamento
+def build_chart2(cube):
+    sum_residuos_urbanos = cube.rollup("DEPARTAMENTO")[["QRESIDUOS_MUN"]].reset_index()
+    sum_residuos_urbanos.rename(columns={"QRESIDUOS_MUN": "Residuos Municipales"}, inplace=True)
+    fig = px.scatter(sum_residuos_urbanos, x="DEPARTAMENTO", y="Residuos Municipales",
+                    size="Residuos Municipales", color="DEPARTAMENTO",
+                    hover_name="DEPARTAMENTO", title="Residuos Municipales Ton/Año por Departamento",
+                    labels={"Residuos Domiciliarios": "Residuos Municipales", "DEPARTAMENTO": "Departamento"},
+                    size_max=60,
+                    color_discrete_sequence=px.colors.qualitative.Set3)
+    fig.update_yaxes(title_text="Residuos Municipales 2014 - 2021")
+    fig.update_layout(xaxis_tickangle=-45)
+    fig.update_layout(
+        xaxis=dict(title='Departamento'),
+        yaxis=dict(title='Residuos Municipales 2014 - 2021'),
+        template="plotly_dark",
+        font=dict(family="Arial", size=12, color="white"),
+    )
+    return fig
+
+
+# Métricas derivadas (metrics.py) que acompañan a la tabla del tercer gráfico
+CHART3_METRICS = ['PER_CAPITA_MUN', 'PARTICIPACION', 'CRECIMIENTO_MUN']
+
+
+# Tabla del tercer gráfico: totales de QRESIDUOS_MUN por DEPARTAMENTO en un PERIODO (consulta al cubo)
+def chart3_table(cube, selected_periodo):
+    df_grouped = cube.slice('DEPARTAMENTO', PERIODO=selected_periodo)[['QRESIDUOS_MUN']].reset_index()
+    return df_grouped
+
+
+# Tabla del tercer gráfico que se muestra: totales y métricas por departamento (ver query.py)
+def chart3_query(engine, selected_periodo):
+    df_grouped = engine.run('DEPARTAMENTO', ['QRESIDUOS_MUN'] + CHART3_METRICS, periodo=selected_periodo)
+    return df_grouped
+
+
+# Tercer gráfico: residuos por departamento en el PERIODO seleccionado
+def build_chart3(cube, selected_periodo):
+    df_grouped = chart3_table(cube, selected_periodo)
+
+    # Plot with Plotly
+    fig = px.line(df_grouped, x='DEPARTAMENTO', y='QRESIDUOS_MUN', title='Residuos por departamento ')
+
+    # Add circular markers and customize the style
+    fig.update_traces(
+        mode='lines+markers',
+        marker=dict(symbol='circle', size=10, color='red'),
+        line=dict(color='blue', width=2)
+    )
+
+    # Update layout for advanced styling
+    fig.update_layout(
+        title=dict(
+            text='Residuos por departamento - '+str(selected_periodo),
+            font=dict(size=20, color='darkblue'),
+            # x=0.5  # Center the title
+        ),
+        xaxis=dict(
+            title='Departamento',
+            titlefont=dict(size=16, color='darkblue'),
+            tickfont=dict(size=14, color='black'),
+            showgrid=True,
+            gridcolor='lightgrey'
+        ),
+        yaxis=dict(
+            title='Cantidad de Residuos',
+            titlefont=dict(size=16, color='darkblue'),
+            tickfont=dict(size=14, color='black'),
+            showgrid=True,
+            gridcolor='lightgrey'
+        ),
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        hovermode='x unified'
+    )
+    return fig
+
+
+# Tabla del cuarto gráfico: filas del distrito ya unidas con sus coordenadas
+# (búsqueda por UBIGEO en la tabla precalculada)
+def chart4_table(geo_table, ubigeo):
+    merged_df = geo_table.district(ubigeo)[DISTRITO_COLUMNS + GEO_TABLE_COLUMNS]
+    return merged_df
+
+
+# Cuarto gráfico (mapa): total de residuos del distrito seleccionado
+def build_chart4_map(merged_df):
+    fig = px.scatter_mapbox(
+        merged_df,
+        hover_name="DISTRITO",
+        hover_data=["DEPARTAMENTO", "PROVINCIA", "QRESIDUOS_MUN_SUM"],
+        title="Total de Residuos por Distrito del 2014 al 2021",
+        lat="latitud",
+        lon="longitud",
+        zoom=11,
+        height=400,
+        color="QRESIDUOS_MUN_SUM",
+        size="QRESIDUOS_MUN_SUM",
+        # color_continuous_scale="Viridis",  # Cute color scale
+        # opacity=0.7,  # Cute opacity level
+        labels={"QRESIDUOS_MUN_SUM": "Total Residuos "},
+        center={"lat": merged_df["latitud"].mean(), "lon": merged_df["longitud"].mean()},
+    )
+    fig.update_layout(mapbox_style="open-street-map")
+    return fig
+
+
+# Cuarto gráfico (barras): residuos domiciliarios y no domiciliarios del distrito por PERIODO
+def build_chart4_bar(merged_df):
+    fig = px.bar(
+    merged_df,
+    x='PERIODO',
+    y=['QRESIDUOS_DOM', 'QRESIDUOS_NO_DOM'],
+    barmode='group',
+    title='QRESIDUOS_DOM y QRESIDUOS_NO_DOM por PERIODO',
+    color_discrete_map={'QRESIDUOS_DOM': 'green', 'QRESIDUOS_NO_DOM': 'gray'}
+    )
+    # Customize hover template
+    fig.update_traces(
+        hovertemplate='<b style="color:red;">Periodo</b>: %{x}<br><b style="color:blue;">Cantidad</b>: %{y:.2f} <b style="color:black;">Ton/Año</b>'
+    )
+
+    fig.update_layout(
+    xaxis_title='Periodo',
+    yaxis_title='Cantidad',
+    yaxis_tickformat=',.2f',  # Format y-axis ticks as whole numbers
+    font=dict(size=10),  # Set font size
+    plot_bgcolor='rgba(0,0,0,0)', # Transparent background
+    legend_title_text='TIPO DE RESIDUOS'
+)
+    return fig
+
+
+# Quinto gráfico: mapa nacional con la capa ya agrupada en el servidor
+def build_chart5(geo_table, selected_periodo, zoom):
+    # Capa agrupada en celdas según el zoom, cacheada por periodo y zoom
+    capa = geo_table.layer(selected_periodo, zoom)
+    # Scattermapbox se dibuja con WebGL; solo viaja una fila por celda, no un punto por distrito
+    fig = go.Figure(go.Scattermapbox(
+        lat=capa['latitud'],
+        lon=capa['longitud'],
+        mode='markers',
+        marker=dict(
+            size=capa['QRESIDUOS_MUN'],
+            sizemode='area',
+            sizeref=2.0 * capa['QRESIDUOS_MUN'].max() / (40 ** 2),
+            sizemin=3,
+            color=capa['QRESIDUOS_MUN'],
+            colorscale='Viridis',
+            showscale=True,
+            colorbar=dict(title='Ton/Año'),
+        ),
+        customdata=capa[['DISTRITOS', 'PRINCIPAL']],
+        hovertemplate="<b>%{customdata[1]}</b><br>"
+                      "<b>Distritos</b>: %{customdata[0]}<br>"
+                      "<b>Total</b>: %{marker.color:,.2f} Ton/Año<br>"
+                      "<extra></extra>",
+    ))
+    fig.update_layout(
+        title='Residuos municipales por distrito - ' + str(selected_periodo),
+        mapbox=dict(style='open-street-map', zoom=zoom, center=dict(lat=-9.19, lon=-75.02)),
+        height=700,
+        margin=dict(l=0, r=0, t=40, b=0),
+    )
+    return fig
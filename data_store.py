@@ -0,0 +1,401 @@
+# Capa de carga de datos: convierte los CSV (latin1, separados por ";") a un formato columnar
+# una sola vez y reutiliza esa copia mientras el CSV de origen no cambie. Los datos de
+# residuos se guardan en Arrow IPC y se mapean en memoria, así todas las sesiones y procesos
+# del host leen las mismas páginas.
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import pandas as pd
+import pyarrow as pa
+
+# Directorio donde se guardan las copias columnares y sus metadatos
+CACHE_DIR = os.environ.get('RSOLIDOS_CACHE_DIR', '.cache')
+
+# Tipos explícitos para residuos_municipales.csv
+RESIDUOS_DTYPES = {
+    'FECHA_CORTE': 'int32',
+    'N_SEC': 'int32',
+    'UBIGEO': 'int32',
+    'REG_NAT': 'category',
+    'DEPARTAMENTO': 'category',
+    'PROVINCIA': 'category',
+    'DISTRITO': 'category',
+    'POB_TOTAL': 'int32',
+    'POB_URBANA': 'int32',
+    'POB_RURAL': 'int32',
+    'GPC_DOM': 'float64',
+    'QRESIDUOS_DOM': 'float64',
+    'QRESIDUOS_NO_DOM': 'float64',
+    'QRESIDUOS_MUN': 'float64',
+    'PERIODO': 'int16',
+}
+
+# Tipos explícitos para TB_UBIGEOS.csv (la primera columna trae el BOM leído como latin1)
+UBIGEOS_DTYPES = {
+    'ubigeo_reniec': 'float64',
+    'ubigeo_inei': 'int32',
+    'departamento_inei': 'int16',
+    'departamento': 'category',
+    'provincia_inei': 'int16',
+    'provincia': 'category',
+    'distrito': 'category',
+    'region': 'category',
+    'macroregion_inei': 'category',
+    'macroregion_minsa': 'category',
+    'iso_3166_2': 'category',
+    'fips': 'int16',
+    'superficie': 'float64',
+    'altitud': 'float64',
+    'latitud': 'float64',
+    'longitud': 'float64',
+    'Frontera': 'category',
+}
+
+# Versión del formato en disco; cambiarla obliga a reconstruir las copias
+STORE_VERSION = 2
+
+# Presupuesto de memoria (MB) para convertir un CSV de residuos en particiones: se lee por
+# bloques de ese tamaño (ver streaming.py), así el CSV puede tener millones de filas
+CSV_MEMORY_MB = float(os.environ.get('RSOLIDOS_CSV_MEMORY_MB', 256))
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_paths(csv_path):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    base = os.path.join(CACHE_DIR, name)
+    return base + '.parquet', base + '.json'
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path, writer):
+    # Escribir en un archivo temporal y renombrar, para que varias réplicas
+    # nunca lean una copia a medio escribir
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    writer(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_meta(meta_path, meta):
+    def _writer(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(meta, fh)
+    _write_atomic(meta_path, _writer)
+
+
+def source_meta(csv_path):
+    # Huella del CSV de origen: mtime y tamaño para la comprobación rápida, sha256 para la definitiva
+    stat = os.stat(csv_path)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': None, 'version': STORE_VERSION}
+
+
+def _check_fresh(csv_path, meta, on_touch):
+    # Devuelve True si `meta` todavía describe el CSV; si solo cambió el mtime
+    # (p. ej. un checkout nuevo) compara el sha256 y actualiza el mtime con `on_touch`
+    if meta is None or meta.get('version') != STORE_VERSION:
+        return False
+    current = source_meta(csv_path)
+    if meta['mtime_ns'] == current['mtime_ns'] and meta['size'] == current['size']:
+        return True
+    if meta['size'] == current['size'] and meta['sha256'] == _file_sha256(csv_path):
+        meta.update(mtime_ns=current['mtime_ns'])
+        on_touch(meta)
+        return True
+    return False
+
+
+def _load_cached(csv_path, read_csv):
+    parquet_path, meta_path = _cache_paths(csv_path)
+    meta = _read_meta(meta_path)
+    if os.path.exists(parquet_path) and _check_fresh(csv_path, meta, lambda m: _write_meta(meta_path, m)):
+        return pd.read_parquet(parquet_path)
+    # Reconstruir la copia columnar a partir del CSV
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    meta = source_meta(csv_path)
+    meta['sha256'] = _file_sha256(csv_path)
+    df = read_csv(csv_path)
+    _write_atomic(parquet_path, lambda tmp_path: df.to_parquet(tmp_path, engine='pyarrow'))
+    _write_meta(meta_path, meta)
+    return df
+
+
+def read_residuos_csv(csv_path):
+    df = pd.read_csv(csv_path, encoding="latin1", delimiter=";", dtype=RESIDUOS_DTYPES)
+    return df.set_index('FECHA_CORTE')
+
+
+def read_ubigeos_csv(csv_path):
+    df = pd.read_csv(csv_path, encoding="latin1", delimiter=";", index_col=0, dtype=UBIGEOS_DTYPES)
+    return df
+
+
+# Particiones por PERIODO de los datos de residuos: el CSV base se divide en una partición
+# por año y cada nuevo año publicado se agrega con ingest_period() sin tocar las demás
+PARTITIONS_DIR = os.path.join(CACHE_DIR, 'residuos')
+MANIFEST_PATH = os.path.join(PARTITIONS_DIR, 'manifest.json')
+CATEGORY_COLUMNS = [c for c, dtype in RESIDUOS_DTYPES.items() if dtype == 'category']
+
+
+def set_cache_dir(path):
+    # Cambiar el directorio de caché (p. ej. para benchmarks con datos sintéticos)
+    global CACHE_DIR, PARTITIONS_DIR, MANIFEST_PATH
+    CACHE_DIR = path
+    PARTITIONS_DIR = os.path.join(CACHE_DIR, 'residuos')
+    MANIFEST_PATH = os.path.join(PARTITIONS_DIR, 'manifest.json')
+
+
+def _partition_path(periodo):
+    return os.path.join(PARTITIONS_DIR, f'PERIODO={periodo}.arrow')
+
+
+def write_arrow(path, df):
+    # Arrow IPC sin compresión y con un solo bloque por columna, para poder mapearlo en memoria
+    table = pa.Table.from_pandas(df, preserve_index=True).combine_chunks()
+
+    def _writer(tmp_path):
+        with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    _write_atomic(path, _writer)
+
+
+def read_arrow(path):
+    # DataFrame de solo lectura respaldado por el archivo mapeado: las columnas numéricas
+    # apuntan a las páginas del archivo, que el sistema comparte entre todos los procesos
+    # del host, en lugar de copiarse al heap de cada proceso
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def shared_frame(name, version, build):
+    # Instantánea compartida de un DataFrame derivado: el primer proceso que la necesita la
+    # arma con build() y la escribe; los demás (y las sesiones siguientes) solo la mapean
+    snapshots_dir = os.path.join(CACHE_DIR, 'snapshots')
+    path = os.path.join(snapshots_dir, f'{name}-{version}.arrow')
+    if not os.path.exists(path):
+        os.makedirs(snapshots_dir, exist_ok=True)
+        write_arrow(path, build())
+        # Borrar versiones anteriores; quien las tenga mapeadas puede seguir leyéndolas
+        for old in glob.glob(os.path.join(snapshots_dir, f'{name}-*.arrow')):
+            if old != path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+    return read_arrow(path)
+
+
+def read_manifest():
+    # {'sources': {nombre CSV: metadatos}, 'partitions': {periodo: {'version', 'source', 'rows'}}}
+    manifest = _read_meta(MANIFEST_PATH) or {}
+    manifest.setdefault('sources', {})
+    manifest.setdefault('partitions', {})
+    return manifest
+
+
+def iter_residuos_csv(csv_path, memory_budget_mb=None):
+    # El CSV de residuos en bloques con los tipos de RESIDUOS_DTYPES, dimensionados para
+    # `memory_budget_mb` (por defecto CSV_MEMORY_MB)
+    import streaming
+    chunks, _report = streaming.stream(csv_path, memory_budget_mb or CSV_MEMORY_MB, dtype=RESIDUOS_DTYPES)
+    return chunks
+
+
+def _spool_partitions(chunks, spool_dir, skip=(), validate=None):
+    # Separar cada bloque por PERIODO y guardar los trozos en `spool_dir`; en memoria queda
+    # un solo bloque a la vez. Devuelve {periodo: [(archivo del trozo, filas)]}
+    os.makedirs(spool_dir, exist_ok=True)
+    pieces = {}
+    for i, chunk in enumerate(chunks):
+        if validate is not None:
+            validate(chunk)
+        for periodo, part in chunk.groupby('PERIODO', sort=True):
+            periodo = int(periodo)
+            if periodo in skip:
+                continue
+            path = os.path.join(spool_dir, f'PERIODO={periodo}-{i:06d}.arrow')
+            write_arrow(path, part)
+            pieces.setdefault(periodo, []).append((path, len(part)))
+    return pieces
+
+
+def _write_partitions(pieces, source, manifest):
+    # Unir los trozos de cada PERIODO en su partición (de a un PERIODO por vez) y registrarla
+    # en el manifiesto; un PERIODO que cupo en un solo bloque ya es su partición
+    os.makedirs(PARTITIONS_DIR, exist_ok=True)
+    sha256 = manifest['sources'][source]['sha256']
+    written = []
+    for periodo in sorted(pieces):
+        paths = [path for path, _rows in pieces[periodo]]
+        if len(paths) == 1:
+            os.replace(paths[0], _partition_path(periodo))
+        else:
+            write_arrow(_partition_path(periodo), concat_partitions([read_arrow(path) for path in paths]))
+        manifest['partitions'][str(periodo)] = {
+            'version': f'{sha256[:12]}-{periodo}',
+            'source': source,
+            'rows': sum(rows for _path, rows in pieces[periodo]),
+        }
+        written.append(periodo)
+    return written
+
+
+def _spool_dir():
+    return os.path.join(PARTITIONS_DIR, f'.spool-{os.getpid()}-{threading.get_ident()}')
+
+
+def validate_schema(df):
+    # Las columnas de un nuevo periodo deben coincidir con las del CSV base
+    expected = [c for c in RESIDUOS_DTYPES if c != 'FECHA_CORTE']
+    columns = list(df.columns)
+    if columns != expected:
+        missing = [c for c in expected if c not in columns]
+        extra = [c for c in columns if c not in expected]
+        raise ValueError(f"Schema mismatch: missing columns {missing}, unexpected columns {extra}, "
+                         f"expected order {expected}.")
+    if df['PERIODO'].isna().any():
+        raise ValueError("Rows without PERIODO.")
+
+
+def sync_base(csv_path):
+    # Mantener las particiones del CSV base al día (solo se vuelve a parsear si cambió)
+    manifest = read_manifest()
+    source = os.path.basename(csv_path)
+    meta = manifest['sources'].get(source)
+    periodos = [p for p, e in manifest['partitions'].items() if e['source'] == source]
+    present = periodos and all(os.path.exists(_partition_path(p)) for p in periodos)
+    if present and _check_fresh(csv_path, meta, lambda m: _write_manifest(manifest)):
+        return []
+    meta = source_meta(csv_path)
+    meta['sha256'] = _file_sha256(csv_path)
+    manifest['sources'][source] = meta
+    for periodo in periodos:
+        del manifest['partitions'][periodo]
+    # Los PERIODO reemplazados con ingest_period() pertenecen a su propio archivo
+    owned = {int(p) for p in manifest['partitions']}
+    spool_dir = _spool_dir()
+    try:
+        pieces = _spool_partitions(iter_residuos_csv(csv_path), spool_dir, skip=owned)
+        written = _write_partitions(pieces, source, manifest)
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+    _write_manifest(manifest)
+    return written
+
+
+def ingest_period(csv_path, replace=False):
+    # Agregar los periodos de un nuevo CSV de SIGERSOL como particiones propias. Si algún
+    # PERIODO ya existe se rechaza, salvo con replace=True (p. ej. una republicación). El
+    # archivo se lee por bloques; ninguna partición se toca hasta haberlo validado entero
+    spool_dir = _spool_dir()
+    try:
+        try:
+            pieces = _spool_partitions(iter_residuos_csv(csv_path), spool_dir, validate=validate_schema)
+        except (ValueError, KeyError) as err:
+            raise ValueError(f"{csv_path}: cannot read with the residuos schema: {err}") from err
+        manifest = read_manifest()
+        existing = [str(p) for p in sorted(pieces) if str(p) in manifest['partitions']]
+        if existing and not replace:
+            raise ValueError(f"PERIODO {existing} already loaded; use replace=True to overwrite.")
+        source = os.path.basename(csv_path)
+        meta = source_meta(csv_path)
+        meta['sha256'] = _file_sha256(csv_path)
+        manifest['sources'][source] = meta
+        written = _write_partitions(pieces, source, manifest)
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+    _write_manifest(manifest)
+    return written
+
+
+def _write_manifest(manifest):
+    os.makedirs(PARTITIONS_DIR, exist_ok=True)
+    _write_meta(MANIFEST_PATH, manifest)
+
+
+def concat_partitions(parts):
+    # Unir particiones conservando las columnas geográficas como categóricas
+    df = pd.concat(parts)
+    for column in CATEGORY_COLUMNS:
+        if df[column].dtype != 'category':
+            df[column] = df[column].astype('category')
+    return df
+
+
+class ResiduosStore:
+    # Particiones cargadas en memoria por el proceso; refresh() solo lee las que cambiaron
+    def __init__(self, csv_path='residuos_municipales.csv'):
+        self.csv_path = csv_path
+        self.partitions = {}
+        self.versions = {}
+        self._manifest_mtime = None
+        self._frame = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    @property
+    def version(self):
+        digest = hashlib.sha256()
+        for periodo in sorted(self.versions):
+            digest.update(f'{periodo}:{self.versions[periodo]};'.encode())
+        return digest.hexdigest()[:16]
+
+    def refresh(self):
+        # Devuelve los PERIODO agregados, reemplazados o eliminados desde la última llamada
+        with self._lock:
+            sync_base(self.csv_path)
+            mtime = os.stat(MANIFEST_PATH).st_mtime_ns
+            if mtime == self._manifest_mtime:
+                return []
+            self._manifest_mtime = mtime
+            entries = {int(p): e for p, e in read_manifest()['partitions'].items()}
+            changed = [p for p in self.versions if p not in entries]
+            for periodo in changed:
+                del self.partitions[periodo]
+                del self.versions[periodo]
+            for periodo, entry in sorted(entries.items()):
+                if self.versions.get(periodo) != entry['version']:
+                    self.partitions[periodo] = read_arrow(_partition_path(periodo))
+                    self.versions[periodo] = entry['version']
+                    changed.append(periodo)
+            if changed:
+                self._frame = None
+            return sorted(changed)
+
+    def frame(self):
+        # Todas las particiones en un solo DataFrame de solo lectura, mapeado desde una
+        # instantánea compartida (se escribe una vez por versión de los datos en todo el host)
+        with self._lock:
+            if self._frame is None:
+                partitions = [self.partitions[p] for p in sorted(self.partitions)]
+                self._frame = shared_frame('residuos', self.version, lambda: concat_partitions(partitions))
+            return self._frame
+
+
+def data_version(*csv_paths):
+    # Versión de los datos: combina el sha256 de cada CSV de origen registrado en CACHE_DIR
+    digest = hashlib.sha256()
+    for csv_path in csv_paths:
+        meta = _read_meta(_cache_paths(csv_path)[1]) or {}
+        digest.update(str(meta.get('sha256')).encode())
+    return digest.hexdigest()[:16]
+
+
+def read_ubigeos(csv_path='TB_UBIGEOS.csv'):
+    return _load_cached(csv_path, read_ubigeos_csv)
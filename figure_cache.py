@@ -0,0 +1,57 @@
+# Caché LRU de figuras de Plotly ya armadas, acotada por número de entradas y por el tamaño de
+# su JSON
+import threading
+from collections import OrderedDict
+
+
+class FigureCache:
+    # Clave: (id del gráfico, parámetros, versión de los datos de que depende). Al cambiar esa
+    # versión la entrada antigua deja de coincidir y termina expulsada por el LRU; los gráficos
+    # de otros PERIODO conservan sus figuras
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Las sesiones de Streamlit corren en hilos distintos del mismo proceso
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(chart_id, params, data_version):
+        return (chart_id, tuple(sorted(params.items())), data_version)
+
+    def get_or_load(self, chart_id, params, data_version, load):
+        # Devuelve (figura, bytes de su JSON); `load` solo se llama si no está en caché. Se guarda
+        # el objeto (go.Figure) y no el JSON: st.plotly_chart no vuelve a validar un objeto, y un
+        # dict sí en cada rerun. Las figuras se comparten entre sesiones, no deben modificarse
+        key = self.make_key(chart_id, params, data_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        entry = load()
+        with self._lock:
+            self._put(key, entry)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+    def _put(self, key, entry):
+        nbytes = entry[1]
+        if nbytes > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        self._entries[key] = entry
+        self._bytes += nbytes
+        # Expulsar las menos usadas hasta respetar ambos límites
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _key, old = self._entries.popitem(last=False)
+            self._bytes -= old[1]
@@ -0,0 +1,118 @@
+# Estructuras geográficas precalculadas sobre los datos de residuos
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Columnas de TB_UBIGEOS que se unen a cada fila de residuos
+GEO_COLUMNS = ['latitud', 'longitud', 'altitud', 'superficie', 'region']
+# Columnas con que se reportan las filas de residuos sin coordenadas
+UNMATCHED_COLUMNS = ['UBIGEO', 'PERIODO', 'DEPARTAMENTO', 'PROVINCIA', 'DISTRITO']
+# Tamaño de celda (en grados) con que se agrupan los distritos según el zoom del mapa
+# nacional; None muestra cada distrito como un punto
+ZOOM_CELL_DEGREES = {4: 2.0, 5: 1.0, 6: 0.5, 7: 0.25, 8: None}
+
+
+def canonical_ubigeo(codes):
+    # UBIGEO canónico: texto de 6 dígitos con ceros a la izquierda ("10101" -> "010101")
+    if codes.dtype.kind in 'iuf':
+        codes = codes.astype('int64').astype(str)
+    return codes.astype(str).str.strip().str.zfill(6)
+
+
+class UbigeoIndex:
+    # Índice jerárquico departamento -> provincia -> distrito -> UBIGEO, para poblar los
+    # selectbox en O(hijos) y obtener el distrito sin recorrer el DataFrame
+    def __init__(self, df):
+        keys = ['DEPARTAMENTO', 'PROVINCIA', 'DISTRITO']
+        # Recorrer los distritos en orden de aparición (el orden del UBIGEO en el CSV)
+        districts = df[keys + ['UBIGEO']].drop_duplicates(keys)
+        districts = districts.assign(UBIGEO=canonical_ubigeo(districts['UBIGEO']))
+        self.tree = {}
+        for dep, prov, dist, ubigeo in districts.itertuples(index=False):
+            self.tree.setdefault(dep, {}).setdefault(prov, {})[dist] = ubigeo
+
+    def departamentos(self):
+        return list(self.tree)
+
+    def provincias(self, departamento):
+        return list(self.tree.get(departamento, {}))
+
+    def distritos(self, departamento, provincia):
+        return list(self.tree.get(departamento, {}).get(provincia, {}))
+
+    def ubigeo(self, departamento, provincia, distrito):
+        return self.tree[departamento][provincia][distrito]
+
+
+def join_ubigeos(df, dful):
+    # Une los residuos con las coordenadas de TB_UBIGEOS; devuelve (tabla unida indexada por
+    # UBIGEO canónico, filas de residuos cuyo UBIGEO no existe en TB_UBIGEOS)
+    coords = dful[['ubigeo_inei'] + GEO_COLUMNS]
+    coords = coords.assign(UBIGEO=canonical_ubigeo(coords['ubigeo_inei'])).drop(columns='ubigeo_inei')
+    coords = coords.drop_duplicates('UBIGEO')
+    residuos = df.reset_index(drop=True)
+    residuos = residuos.assign(UBIGEO=canonical_ubigeo(residuos['UBIGEO']))
+    joined = residuos.merge(coords, on='UBIGEO', how='left', indicator=True, validate='many_to_one')
+    matched = joined['_merge'] == 'both'
+    unmatched = joined.loc[~matched, UNMATCHED_COLUMNS].reset_index(drop=True)
+    table = joined.loc[matched].drop(columns='_merge')
+    # Total del distrito en todo el periodo, usado por el mapa
+    table['QRESIDUOS_MUN_SUM'] = table.groupby('UBIGEO')['QRESIDUOS_MUN'].transform('sum')
+    return table.set_index('UBIGEO').sort_index(kind='stable'), unmatched
+
+
+class GeoTable:
+    # Residuos unidos una sola vez con las coordenadas de TB_UBIGEOS, indexados por
+    # UBIGEO canónico; el mapa del distrito es una búsqueda por clave, sin merge por rerun
+    def __init__(self, df, dful=None, table=None, unmatched=None):
+        # Con `table` y `unmatched` se reutiliza una unión ya hecha (p. ej. una instantánea
+        # compartida); las filas sin coordenadas se reportan igual en cada proceso
+        if table is None:
+            table, unmatched = join_ubigeos(df, dful)
+        self.table = table
+        self.unmatched = unmatched if unmatched is not None else table.reset_index().iloc[:0][UNMATCHED_COLUMNS]
+        if not self.unmatched.empty:
+            logger.warning("%d rows without a TB_UBIGEOS match: %s", len(self.unmatched),
+                           sorted(self.unmatched['UBIGEO'].unique()))
+        self._layers = {}
+
+    def district(self, ubigeo):
+        # Filas (una por PERIODO) del distrito; vacío si el UBIGEO no tiene coordenadas
+        # get_loc usa la búsqueda binaria del índice ordenado; `in` recorre el índice no único
+        try:
+            loc = self.table.index.get_loc(ubigeo)
+        except KeyError:
+            return self.table.iloc[:0]
+        if isinstance(loc, (int, np.integer)):
+            loc = slice(loc, loc + 1)
+        return self.table.iloc[loc]
+
+    def layer(self, periodo, zoom):
+        # Capa del mapa nacional para un PERIODO y nivel de zoom, agrupada en el servidor;
+        # se calcula una vez por (periodo, zoom) y se reutiliza
+        key = (periodo, zoom)
+        if key not in self._layers:
+            points = self.table[(self.table['PERIODO'] == periodo) & self.table['latitud'].notna()]
+            self._layers[key] = bin_points(points.reset_index(), ZOOM_CELL_DEGREES[zoom])
+        return self._layers[key]
+
+
+def bin_points(points, cell_degrees):
+    # Agrupa los distritos en celdas cuadradas de `cell_degrees` grados: una fila por celda
+    # con el centroide, el total de residuos, el número de distritos y el distrito principal
+    points = points.sort_values('QRESIDUOS_MUN', ascending=False)
+    if cell_degrees is None:
+        cells = points['UBIGEO']
+    else:
+        cells = [np.floor(points['latitud'] / cell_degrees).astype('int64'),
+                 np.floor(points['longitud'] / cell_degrees).astype('int64')]
+    binned = points.groupby(cells, sort=False).agg(
+        latitud=('latitud', 'mean'),
+        longitud=('longitud', 'mean'),
+        QRESIDUOS_MUN=('QRESIDUOS_MUN', 'sum'),
+        DISTRITOS=('UBIGEO', 'size'),
+        PRINCIPAL=('DISTRITO', 'first'),
+    )
+    return binned.reset_index(drop=True)
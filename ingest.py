@@ -0,0 +1,23 @@
+# Agregar un nuevo PERIODO publicado por SIGERSOL sin recargar todo el histórico:
+#   python ingest.py residuos_2022.csv [--replace]
+# El archivo se valida contra las columnas de residuos_municipales.csv y se guarda como
+# partición propia; la aplicación en ejecución la incorpora en el siguiente rerun.
+import argparse
+
+import data_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingresar un CSV de residuos como nueva partición por PERIODO")
+    parser.add_argument('csv_path', help="CSV con el mismo formato que residuos_municipales.csv")
+    parser.add_argument('--replace', action='store_true', help="sobrescribir los PERIODO que ya existan")
+    args = parser.parse_args()
+    try:
+        written = data_store.ingest_period(args.csv_path, replace=args.replace)
+    except ValueError as err:
+        parser.error(str(err))
+    print(f"PERIODO ingresados: {', '.join(str(p) for p in written)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+# Instrumentación de cada rerun de la aplicación: tiempo por etapa, aciertos/fallos de caché,
+# memoria de los DataFrame cargados y tamaño de las figuras enviadas al navegador.
+# Cada rerun deja una línea JSON en el log "rsolidos.metrics" y suma a contadores del proceso
+# que se exportan en formato de texto de Prometheus.
+#   RSOLIDOS_METRICS_LOG=/ruta/metrics.jsonl  (o "-" para stderr): log estructurado por rerun
+#   RSOLIDOS_METRICS_FILE=/ruta/rsolidos-{pid}.prom: archivo para el textfile collector de
+#   node_exporter ({pid} se reemplaza por el proceso, para que cada réplica tenga el suyo)
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('rsolidos.metrics')
+
+METRICS_LOG = os.environ.get('RSOLIDOS_METRICS_LOG')
+METRICS_FILE = os.environ.get('RSOLIDOS_METRICS_FILE', '').format(pid=os.getpid()) or None
+
+if METRICS_LOG and not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr) if METRICS_LOG == '-' else logging.FileHandler(METRICS_LOG)
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Cada sesión de Streamlit ejecuta sus reruns en su propio hilo
+_local = threading.local()
+
+
+def current_rss_mb():
+    # Memoria residente actual del proceso (Linux); None si no se puede leer
+    try:
+        with open('/proc/self/statm') as fh:
+            pages = int(fh.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+class RerunMetrics:
+    def __init__(self):
+        self.started = time.time()
+        self.page = []
+        self.stages = []
+        self.cache = {}
+        self.frames = []
+        self.figures = []
+        self._misses = {}
+
+    @contextmanager
+    def stage(self, name):
+        # Tiempo de pared y variación de memoria residente de una etapa (la memoria es del
+        # proceso entero, así que otras sesiones concurrentes también influyen)
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            rss_after = current_rss_mb()
+            self.stages.append({
+                'stage': name,
+                'seconds': time.perf_counter() - start,
+                'rss_delta_mb': None if rss_before is None or rss_after is None else rss_after - rss_before,
+            })
+
+    def record_miss(self, name):
+        self._misses[name] = self._misses.get(name, 0) + 1
+
+    def cache_event(self, name, hit):
+        counts = self.cache.setdefault(name, {'hit': 0, 'miss': 0})
+        counts['hit' if hit else 'miss'] += 1
+
+    def frame(self, name, df):
+        self.frames.append({'name': name, 'rows': len(df), 'bytes': int(df.memory_usage(deep=True).sum())})
+
+    def figure(self, chart_id, nbytes, hit):
+        self.figures.append({'chart_id': chart_id, 'bytes': nbytes, 'cached': hit})
+
+    def as_dict(self):
+        return {
+            'started': self.started,
+            'page': ' > '.join(self.page),
+            'seconds': time.time() - self.started,
+            'stages': self.stages,
+            'cache': self.cache,
+            'frames': self.frames,
+            'figures': self.figures,
+        }
+
+
+def begin_rerun():
+    _local.metrics = RerunMetrics()
+    return _local.metrics
+
+
+def current():
+    # Métricas del rerun en curso en este hilo (se crean si aún no hay, p. ej. fuera de la app)
+    metrics = getattr(_local, 'metrics', None)
+    if metrics is None:
+        metrics = begin_rerun()
+    return metrics
+
+
+def stage(name):
+    return current().stage(name)
+
+
+def record_miss(name):
+    # Llamar dentro del cuerpo de una función cacheada: el cuerpo solo corre en un fallo
+    current().record_miss(name)
+
+
+def track_cache(name):
+    # Decorador sobre @st.cache_data/@st.cache_resource: cuenta acierto o fallo según si
+    # el cuerpo llamó a record_miss(name) durante la llamada
+    def decorator(cached_fn):
+        @functools.wraps(cached_fn)
+        def wrapper(*args, **kwargs):
+            metrics = current()
+            before = metrics._misses.get(name, 0)
+            result = cached_fn(*args, **kwargs)
+            metrics.cache_event(name, hit=metrics._misses.get(name, 0) == before)
+            return result
+        wrapper.clear = getattr(cached_fn, 'clear', None)
+        return wrapper
+    return decorator
+
+
+class Registry:
+    # Contadores acumulados del proceso, para exportar a Prometheus
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reruns = 0
+        self.stage_seconds = {}
+        self.stage_count = {}
+        self.cache = {}
+        self.figure_bytes = {}
+        self.figure_count = {}
+
+    def add(self, metrics):
+        with self._lock:
+            self.reruns += 1
+            for item in metrics.stages:
+                self.stage_seconds[item['stage']] = self.stage_seconds.get(item['stage'], 0.0) + item['seconds']
+                self.stage_count[item['stage']] = self.stage_count.get(item['stage'], 0) + 1
+            for name, counts in metrics.cache.items():
+                for result, n in counts.items():
+                    self.cache[(name, result)] = self.cache.get((name, result), 0) + n
+            for item in metrics.figures:
+                self.figure_bytes[item['chart_id']] = self.figure_bytes.get(item['chart_id'], 0) + item['bytes']
+                self.figure_count[item['chart_id']] = self.figure_count.get(item['chart_id'], 0) + 1
+
+    def prometheus_text(self):
+        with self._lock:
+            lines = [
+                '# TYPE rsolidos_reruns_total counter',
+                f'rsolidos_reruns_total {self.reruns}',
+                '# TYPE rsolidos_stage_seconds_total counter',
+            ]
+            lines += [f'rsolidos_stage_seconds_total{{stage="{k}"}} {v:.6f}' for k, v in sorted(self.stage_seconds.items())]
+            lines.append('# TYPE rsolidos_stage_runs_total counter')
+            lines += [f'rsolidos_stage_runs_total{{stage="{k}"}} {v}' for k, v in sorted(self.stage_count.items())]
+            lines.append('# TYPE rsolidos_cache_requests_total counter')
+            lines += [f'rsolidos_cache_requests_total{{cache="{name}",result="{result}"}} {v}'
+                      for (name, result), v in sorted(self.cache.items())]
+            lines.append('# TYPE rsolidos_figure_bytes_total counter')
+            lines += [f'rsolidos_figure_bytes_total{{chart="{k}"}} {v}' for k, v in sorted(self.figure_bytes.items())]
+            lines.append('# TYPE rsolidos_figures_total counter')
+            lines += [f'rsolidos_figures_total{{chart="{k}"}} {v}' for k, v in sorted(self.figure_count.items())]
+            rss = current_rss_mb()
+            if rss is not None:
+                lines += ['# TYPE rsolidos_rss_bytes gauge', f'rsolidos_rss_bytes {int(rss * 1024 * 1024)}']
+            return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+_textfile_lock = threading.Lock()
+
+
+def end_rerun():
+    # Cerrar el rerun: log estructurado, contadores del proceso y archivo de métricas
+    metrics = current()
+    registry.add(metrics)
+    logger.info(json.dumps(metrics.as_dict(), default=str))
+    if METRICS_FILE:
+        # Las sesiones terminan sus reruns en paralelo: un solo escritor a la vez, para que no
+        # compartan el temporal y el archivo no vuelva a contadores más viejos
+        with _textfile_lock:
+            tmp_path = f'{METRICS_FILE}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as fh:
+                fh.write(registry.prometheus_text())
+            os.replace(tmp_path, METRICS_FILE)
+    return metrics
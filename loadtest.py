@@ -0,0 +1,268 @@
+# Prueba de carga sin red externa: levanta app.py con `streamlit run` en un puerto local y lo
+# recorre con sesiones simuladas (clientes websocket del protocolo de Streamlit, uno por hilo) a
+# niveles de concurrencia crecientes:
+#   python loadtest.py --levels 1 2 4 8 16 --duration 30 --output loadtest.json
+#   python loadtest.py --url http://127.0.0.1:8501 --pid 1234   (contra un servidor ya levantado)
+# Cada sesión navega el menú como un usuario (Inicio -> Gráfico 1-5, PERIODO en el tercero y el
+# quinto, departamento/provincia/distrito en el cuarto). Por nivel se reportan p50/p95/p99 de la
+# latencia de rerun, reruns por segundo, CPU y memoria residente del servidor por sesión.
+# Los clientes corren en esta máquina y también consumen CPU: para medir el techo de una réplica
+# conviene mirar cuándo sube la latencia, no solo el CPU del servidor.
+import argparse
+import contextlib
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.error import URLError
+from urllib.request import urlopen
+
+APP_PATH = 'app.py'
+PAGES = ['Gráfico 1', 'Gráfico 2', 'Gráfico 3', 'Gráfico 4', 'Gráfico 5']
+# Proporción de visitas por página (los gráficos con selectores se visitan más)
+PAGE_WEIGHTS = [2, 1, 3, 3, 1]
+RERUN_TIMEOUT = 120
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def process_usage(pid):
+    # (segundos de CPU, MB residentes) de un proceso, leídos de /proc (Linux); None si no se puede
+    if pid is None:
+        return None, None
+    try:
+        with open(f'/proc/{pid}/stat') as fh:
+            fields = fh.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/statm') as fh:
+            pages = int(fh.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None, None
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    return cpu, pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+class Session:
+    # Una sesión del navegador simulada: conexión websocket, estado de los widgets y navegación al
+    # azar (con semilla). Como el navegador, cada rerun envía el valor de todos los widgets visibles
+    def __init__(self, url, seed):
+        from websockets.sync.client import connect
+        ws_url = url.replace('http://', 'ws://').replace('https://', 'wss://').rstrip('/') + '/_stcore/stream'
+        # La conexión queda abierta entre reruns: se entra a su contexto acá y se sale en close()
+        self._stack = contextlib.ExitStack()
+        self.ws = self._stack.enter_context(connect(ws_url, subprotocols=['streamlit'], open_timeout=30, max_size=None))
+        self.rng = random.Random(seed)
+        self.widgets = {}
+        self.elements = []
+        self.latencies = []
+        self.errors = 0
+
+    def close(self):
+        self._stack.close()
+
+    def rerun(self):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        message.rerun_script.page_script_hash = ''
+        message.rerun_script.widget_states.widgets.extend(self.widgets.values())
+        start = time.perf_counter()
+        self.ws.send(message.SerializeToString())
+        elements = []
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(self.ws.recv(timeout=RERUN_TIMEOUT))
+            kind = forward.WhichOneof('type')
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                element_type = element.WhichOneof('type')
+                if element_type == 'exception':
+                    self.errors += 1
+                elements.append((element_type, getattr(element, element_type)))
+            elif kind == 'script_finished':
+                break
+        self.latencies.append(time.perf_counter() - start)
+        self.elements = elements
+        # Solo siguen vigentes los widgets que se dibujaron en este rerun
+        ids = {getattr(proto, 'id', None) for _type, proto in elements}
+        self.widgets = {k: v for k, v in self.widgets.items() if k in ids}
+
+    def _set(self, widget_id, **value):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        self.widgets[widget_id] = WidgetState(id=widget_id, **value)
+
+    def _menu(self, option):
+        # Elegir `option` en el option_menu (componente) que la ofrezca
+        for element_type, proto in self.elements:
+            if element_type == 'component_instance' and option in json.loads(proto.json_args).get('options', []):
+                self._set(proto.id, json_value=json.dumps(option))
+                return True
+        return False
+
+    def _select(self, label):
+        # Elegir una opción al azar de un selectbox y rerun (como al cambiar el filtro)
+        for element_type, proto in self.elements:
+            if element_type == 'selectbox' and proto.label == label and proto.options:
+                self._set(proto.id, string_value=self.rng.choice(list(proto.options)))
+                self.rerun()
+                return
+
+    def open(self, page):
+        # Ir a Inicio -> `page`: el submenú aparece recién después de elegir Inicio
+        if not self.elements:
+            self.rerun()
+        if self._menu('Inicio') and not self._menu(page):
+            self.rerun()
+            self._menu(page)
+        self.rerun()
+
+    def step(self):
+        # Abrir una página y usar sus filtros
+        page = self.rng.choices(PAGES, PAGE_WEIGHTS)[0]
+        self.open(page)
+        if page in ('Gráfico 3', 'Gráfico 5'):
+            for _ in range(self.rng.randint(1, 3)):
+                self._select('Selecciona un PERIODO:')
+        elif page == 'Gráfico 4':
+            self._select('Seleccione Departamento')
+            self._select('Seleccione Provincia')
+            self._select('Seleccione Distrito')
+
+
+def run_level(url, pid, concurrency, duration, seed):
+    # `concurrency` sesiones navegando a la vez durante `duration` segundos
+    _cpu, rss_before = process_usage(pid)
+    sessions = [Session(url, seed * 1000 + i) for i in range(concurrency)]
+    failures = []
+    stop = time.perf_counter() + duration
+    cpu_before, _rss = process_usage(pid)
+    start = time.perf_counter()
+
+    def _worker(session):
+        try:
+            while time.perf_counter() < stop:
+                session.step()
+        except Exception as err:
+            failures.append(repr(err))
+
+    threads = [threading.Thread(target=_worker, args=(s,), name=f'loadtest-{i}') for i, s in enumerate(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    cpu_after, rss_after = process_usage(pid)
+    for session in sessions:
+        session.close()
+
+    latencies = [x for s in sessions for x in s.latencies]
+    def ms(seconds):
+        return None if seconds is None else round(seconds * 1000, 1)
+    return {
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 2),
+        'reruns': len(latencies),
+        'errors': sum(s.errors for s in sessions) + len(failures),
+        'failures': failures[:5],
+        'reruns_per_sec': round(len(latencies) / elapsed, 2),
+        'latency_ms': {
+            'p50': ms(percentile(latencies, 50)),
+            'p95': ms(percentile(latencies, 95)),
+            'p99': ms(percentile(latencies, 99)),
+            'mean': ms(statistics.mean(latencies)) if latencies else None,
+        },
+        # Núcleos del servidor usados en promedio (1.0 = un núcleo entero)
+        'server_cpu_cores': None if cpu_before is None else round((cpu_after - cpu_before) / elapsed, 2),
+        'server_rss_mb': None if rss_after is None else round(rss_after, 1),
+        # Memoria del servidor con las sesiones abiertas, sobre la de antes de conectarlas (con
+        # pocas sesiones lo que libera el recolector puede dejarla por debajo de cero)
+        'rss_per_session_mb': None if rss_before is None else round((rss_after - rss_before) / concurrency, 2),
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port):
+    # `streamlit run app.py` en segundo plano; espera a que responda su endpoint de salud
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', APP_PATH, '--server.headless', 'true',
+         '--server.port', str(port), '--browser.gatherUsageStats', 'false'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + RERUN_TIMEOUT
+    while time.time() < deadline:
+        try:
+            with urlopen(url + '/_stcore/health', timeout=2):
+                return server, url
+        except (URLError, OSError):
+            if server.poll() is not None:
+                raise RuntimeError(f"Streamlit exited with code {server.returncode}")
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("Streamlit did not start in time")
+
+
+def warm(url):
+    # Abrir cada página una vez, para que el primer nivel no mida la carga inicial de los datos
+    session = Session(url, 0)
+    try:
+        for page in PAGES:
+            session.open(page)
+    finally:
+        session.close()
+    return session.errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de app.py con sesiones simuladas")
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 2, 4, 8, 16],
+                        help="sesiones concurrentes de cada nivel")
+    parser.add_argument('--duration', type=float, default=20, help="segundos por nivel")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--url', help="servidor ya levantado (por defecto se levanta uno en un puerto libre)")
+    parser.add_argument('--pid', type=int, help="PID de ese servidor, para medir su CPU y memoria")
+    parser.add_argument('--output', help="archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    server = None
+    url, pid = args.url, args.pid
+    if url is None:
+        server, url = start_server(_free_port())
+        pid = server.pid
+    try:
+        report = {'meta': {'url': url, 'duration': args.duration, 'seed': args.seed, 'warm_errors': warm(url)},
+                  'levels': []}
+        print(f"{'sesiones':>8} {'reruns/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'CPU':>5} "
+              f"{'MB/sesión':>10} {'errores':>8}")
+        for concurrency in args.levels:
+            level = run_level(url, pid, concurrency, args.duration, args.seed + concurrency)
+            report['levels'].append(level)
+            latency = level['latency_ms']
+            print(f"{concurrency:>8} {level['reruns_per_sec']:>9} {latency['p50']:>8} {latency['p95']:>8} "
+                  f"{latency['p99']:>8} {level['server_cpu_cores']!s:>5} {level['rss_per_session_mb']!s:>10} "
+                  f"{level['errors']:>8}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# Métricas derivadas de los residuos, calculadas una vez por versión de los datos sobre los
+# rollups del cubo (una pasada vectorizada por nivel) y consultadas luego por clave:
+#   PER_CAPITA_MUN  kg/hab/día de residuos municipales sobre POB_TOTAL
+#   PER_CAPITA_DOM  kg/hab/día de residuos domiciliarios sobre POB_URBANA (mismo criterio que GPC_DOM)
+#   CRECIMIENTO_MUN variación de QRESIDUOS_MUN respecto del PERIODO anterior (0.1 = +10%)
+#   PARTICIPACION   fracción del total nacional de QRESIDUOS_MUN del PERIODO
+#   RATIO_DOM_NO_DOM y FRACCION_DOM: domiciliarios frente a no domiciliarios y sobre el total
+# Las tasas per cápita se ponderan por población (suma de residuos / suma de población),
+# no son un promedio de GPC_DOM; con denominador cero quedan en NaN.
+import pandas as pd
+
+# Niveles de detalle disponibles y sus claves en el cubo
+METRIC_LEVELS = {
+    'nacional': ['PERIODO'],
+    'departamento': ['PERIODO', 'DEPARTAMENTO'],
+    'provincia': ['PERIODO', 'DEPARTAMENTO', 'PROVINCIA'],
+    'distrito': ['PERIODO', 'DEPARTAMENTO', 'PROVINCIA', 'DISTRITO'],
+}
+METRICS = ['PER_CAPITA_MUN', 'PER_CAPITA_DOM', 'CRECIMIENTO_MUN', 'PARTICIPACION', 'RATIO_DOM_NO_DOM', 'FRACCION_DOM']
+# Toneladas al año -> kilogramos al día
+TON_YEAR_TO_KG_DAY = 1000 / 365
+
+
+def _ratio(numerator, denominator):
+    # División que deja NaN (y no inf) cuando el denominador es cero
+    return numerator / denominator.where(denominator != 0)
+
+
+def _previous_periodo(series):
+    # Valor de la misma entidad en PERIODO - 1, alineado con `series` (NaN si no existe)
+    previous = series.copy()
+    if isinstance(previous.index, pd.MultiIndex):
+        previous.index = previous.index.set_levels(previous.index.levels[0] + 1, level='PERIODO')
+    else:
+        previous.index = previous.index + 1
+    return previous.reindex(series.index)
+
+
+def derive(rolled, national_mun):
+    # Métricas de un rollup del cubo; `national_mun` es QRESIDUOS_MUN por PERIODO
+    table = rolled.copy()
+    table['PER_CAPITA_MUN'] = _ratio(table['QRESIDUOS_MUN'], table['POB_TOTAL']) * TON_YEAR_TO_KG_DAY
+    table['PER_CAPITA_DOM'] = _ratio(table['QRESIDUOS_DOM'], table['POB_URBANA']) * TON_YEAR_TO_KG_DAY
+    table['CRECIMIENTO_MUN'] = _ratio(table['QRESIDUOS_MUN'], _previous_periodo(table['QRESIDUOS_MUN'])) - 1
+    periodos = table.index.get_level_values('PERIODO')
+    table['PARTICIPACION'] = _ratio(table['QRESIDUOS_MUN'], pd.Series(national_mun.reindex(periodos).to_numpy(), index=table.index))
+    table['RATIO_DOM_NO_DOM'] = _ratio(table['QRESIDUOS_DOM'], table['QRESIDUOS_NO_DOM'])
+    table['FRACCION_DOM'] = _ratio(table['QRESIDUOS_DOM'], table['QRESIDUOS_MUN'])
+    return table
+
+
+class DerivedMetrics:
+    # Tablas de métricas por nivel, de solo lectura, armadas desde un cubo de aggregates.py
+    def __init__(self, cube):
+        self.periodos = list(cube.periodos)
+        national_mun = cube.rollup('PERIODO')['QRESIDUOS_MUN']
+        self.tables = {level: derive(cube.rollup(keys), national_mun) for level, keys in METRIC_LEVELS.items()}
+        # Diccionario clave -> fila de métricas por nivel, para consultar una entidad sin .loc
+        self._rows = {level: dict(zip(table.index, table[METRICS].to_numpy()))
+                      for level, table in self.tables.items()}
+
+    def table(self, level, periodo=None):
+        # Tabla completa de un nivel (o solo un PERIODO, sin ese nivel en el índice)
+        if level not in self.tables:
+            raise ValueError(f"Unknown metric level: {level}. Must be in {list(self.tables)}.")
+        table = self.tables[level]
+        if periodo is not None:
+            table = table.xs(periodo, level='PERIODO') if isinstance(table.index, pd.MultiIndex) else table.loc[[periodo]]
+        return table
+
+    def get(self, level, *key):
+        # Métricas de una entidad como {métrica: valor}, p. ej. get('provincia', 2014, 'LIMA', 'LIMA');
+        # None si no existe
+        if level not in self._rows:
+            raise ValueError(f"Unknown metric level: {level}. Must be in {list(self._rows)}.")
+        row = self._rows[level].get(key if len(key) > 1 else key[0])
+        return None if row is None else dict(zip(METRICS, row.tolist()))
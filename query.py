@@ -0,0 +1,258 @@
+# Consultas sobre los residuos (filtros, agrupación y medidas) fuera de Streamlit, con caché
+# LRU de resultados por consulta normalizada. La usan el dashboard y un endpoint HTTP/JSON local:
+#   python query.py --port 8765
+#   curl 'http://127.0.0.1:8765/query?group_by=DEPARTAMENTO&measures=QRESIDUOS_MUN&periodo_min=2019'
+#   curl 'http://127.0.0.1:8765/export?group_by=PERIODO,DISTRITO&departamento=LIMA' > lima.csv
+# Se responde desde el cubo de aggregates.py o las tablas de metrics.py cuando la consulta lo
+# permite, y solo si no (filtros por UBIGEO o REG_NAT) recorriendo el DataFrame completo.
+import argparse
+import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import aggregates
+import metrics
+
+# Columnas por las que se puede filtrar o agrupar (filtro en minúsculas -> columna)
+DIMENSIONS = {
+    'periodo': 'PERIODO',
+    'departamento': 'DEPARTAMENTO',
+    'provincia': 'PROVINCIA',
+    'distrito': 'DISTRITO',
+    'ubigeo': 'UBIGEO',
+    'reg_nat': 'REG_NAT',
+}
+# Rango de PERIODO, inclusivo
+RANGE_FILTERS = {'periodo_min': 'PERIODO', 'periodo_max': 'PERIODO'}
+DEFAULT_MEASURES = ('QRESIDUOS_MUN',)
+
+
+def _as_tuple(value):
+    if isinstance(value, str):
+        return tuple(v for v in value.split(',') if v)
+    if isinstance(value, (list, tuple, set)):
+        return tuple(value)
+    return (value,)
+
+
+def normalize_query(group_by=(), measures=None, **filters):
+    # Forma canónica de una consulta: (agrupación, medidas, filtros); dos consultas equivalentes
+    # (mismos valores en otro orden, '2014' o 2014) quedan iguales y comparten entrada en la caché
+    columns = list(DIMENSIONS.values())
+    group_by = _as_tuple(group_by)
+    unknown = [k for k in group_by if k not in columns]
+    if unknown:
+        raise ValueError(f"Unknown group_by columns: {unknown}. Must be in {columns}.")
+    group_by = tuple(c for c in columns if c in group_by)
+
+    measures = _as_tuple(measures or DEFAULT_MEASURES)
+    allowed = aggregates.MEASURES + metrics.METRICS
+    unknown = [m for m in measures if m not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown measures: {unknown}. Must be in {allowed}.")
+
+    normalized = []
+    for name, value in filters.items():
+        if value is None:
+            continue
+        if name in RANGE_FILTERS:
+            normalized.append((name, int(value)))
+        elif name in DIMENSIONS:
+            values = _as_tuple(value)
+            if name in ('periodo', 'ubigeo'):
+                values = tuple(int(v) for v in values)
+            normalized.append((name, tuple(sorted(set(values)))))
+        else:
+            raise ValueError(f"Unknown filter: {name}. Must be in {list(DIMENSIONS) + list(RANGE_FILTERS)}.")
+    return group_by, measures, tuple(sorted(normalized))
+
+
+def _mask(table, filters):
+    # Máscara booleana de los filtros sobre las columnas de `table` (None si no hay filtros)
+    mask = None
+    for name, value in filters:
+        column = table[RANGE_FILTERS.get(name) or DIMENSIONS[name]]
+        if name == 'periodo_min':
+            part = column >= value
+        elif name == 'periodo_max':
+            part = column <= value
+        else:
+            part = column.isin(value)
+        mask = part if mask is None else mask & part
+    return mask
+
+
+def _filter_columns(filters):
+    return {RANGE_FILTERS.get(name) or DIMENSIONS[name] for name, _value in filters}
+
+
+class QueryEngine:
+    # Motor de consultas sobre una versión de los datos: cubo, métricas derivadas y (solo para
+    # filtros que el cubo no tiene) el DataFrame completo, obtenido con `frame()` al necesitarlo
+    def __init__(self, cube, frame, derived=None, version=None, max_entries=512):
+        self.cube = cube
+        self.frame = frame
+        self.derived = derived if derived is not None else metrics.DerivedMetrics(cube)
+        self.version = version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def run(self, group_by=(), measures=None, **filters):
+        # DataFrame con una fila por combinación de `group_by` y una columna por medida; el
+        # resultado es una copia, quien llama puede modificarlo
+        key = normalize_query(group_by, measures, **filters)
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return result.copy()
+            self.misses += 1
+        result = self._execute(*key)
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return result.copy()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._results), 'hits': self.hits, 'misses': self.misses}
+
+    def _execute(self, group_by, measures, filters):
+        columns = set(group_by) | _filter_columns(filters)
+        if any(m in metrics.METRICS for m in measures):
+            return self._from_metrics(group_by, measures, filters, columns)
+        if columns <= set(aggregates.LEVELS):
+            table = self.cube.rollup(list(columns)).reset_index() if columns else self.cube.rollup([])
+        else:
+            table = self.frame()
+        return _aggregate(table, group_by, measures, filters)
+
+    def _from_metrics(self, group_by, measures, filters, columns):
+        # Las métricas derivadas no se pueden volver a sumar: la consulta tiene que coincidir
+        # con un nivel de metrics.py (agrupando por PERIODO o filtrando un solo PERIODO)
+        keys = set(group_by) | {'PERIODO'}
+        level = next((lv for lv, lv_keys in metrics.METRIC_LEVELS.items() if set(lv_keys) == keys), None)
+        periodo = dict(filters).get('periodo', ())
+        if level is None or not columns <= keys or ('PERIODO' not in group_by and len(periodo) != 1):
+            raise ValueError("Derived metrics need group_by to match a level "
+                             f"({list(metrics.METRIC_LEVELS.values())}) with PERIODO grouped or a single periodo filter.")
+        table = self.derived.table(level).reset_index()
+        mask = _mask(table, filters)
+        if mask is not None:
+            table = table[mask]
+        return table[list(group_by) + list(measures)].reset_index(drop=True)
+
+
+def _aggregate(table, group_by, measures, filters):
+    # Filtrar y volver a sumar sobre `group_by` (las medidas del cubo son sumables)
+    mask = _mask(table, filters)
+    if mask is not None:
+        table = table[mask]
+    if group_by:
+        return table.groupby(list(group_by), observed=True)[list(measures)].sum().reset_index()
+    totals = table[list(measures)]
+    return totals.sum().to_frame().T.astype(totals.dtypes.to_dict()).reset_index(drop=True)
+
+
+def _query_params(query_string):
+    # Parámetros de la URL: group_by y measures separados por comas, y los filtros de DIMENSIONS
+    params = {k: v[-1] for k, v in parse_qs(query_string).items()}
+    return params.pop('group_by', ''), params.pop('measures', None), params
+
+
+class QueryServer:
+    # Motor de consultas de la versión actual de los datos. El cubo es uno por servidor y al
+    # ingresar PERIODO se sincroniza solo en los que cambiaron (ver Cube.sync); con cada versión
+    # nueva se rearman las métricas derivadas y la caché de resultados
+    def __init__(self, store):
+        self.store = store
+        self.cube = None
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def engine(self):
+        with self._lock:
+            store = self.store
+            store.refresh()
+            if self.cube is None:
+                self.cube = aggregates.Cube.from_chunks((store.partitions[p] for p in sorted(store.partitions)),
+                                                        store.versions)
+            elif self.cube.versions != store.versions:
+                self.cube.sync(store.partitions, store.versions)
+            if self._engine is None or self._engine.version != store.version:
+                self._engine = QueryEngine(self.cube, store.frame, version=store.version)
+            return self._engine
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                try:
+                    engine = server.engine()
+                    if url.path == '/health':
+                        body = {'version': engine.version, 'periodos': engine.cube.periodos, 'cache': engine.stats()}
+                    elif url.path == '/query':
+                        group_by, measures, filters = _query_params(url.query)
+                        result = engine.run(group_by, measures, **filters)
+                        body = {'version': engine.version, 'columns': list(result.columns),
+                                'data': json.loads(result.to_json(orient='records'))}
+                    elif url.path == '/export':
+                        group_by, measures, filters = _query_params(url.query)
+                        return self._stream_csv(engine.run(group_by, measures, **filters))
+                    else:
+                        return self._send(404, {'error': f'Unknown path: {url.path}'})
+                except ValueError as err:
+                    return self._send(400, {'error': str(err)})
+                self._send(200, body)
+
+            def _stream_csv(self, result):
+                # CSV por lotes (ver tables.py) sin Content-Length: termina al cerrar la conexión
+                import tables
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/csv; charset=utf-8')
+                self.send_header('Content-Disposition', 'attachment; filename="residuos.csv"')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                for chunk in tables.Table(result).iter_csv(index=False):
+                    self.wfile.write(chunk.encode('utf-8'))
+
+            def _send(self, status, body):
+                payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    import data_store
+
+    parser = argparse.ArgumentParser(description="Endpoint HTTP/JSON local de consultas sobre los residuos")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--csv', default='residuos_municipales.csv')
+    args = parser.parse_args()
+    server = QueryServer(data_store.ResiduosStore(args.csv))
+    server.engine()
+    httpd = ThreadingHTTPServer((args.host, args.port), server.handler())
+    print(f"Consultas en http://{args.host}:{args.port}/query (versión {server.engine().version})")
+    httpd.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
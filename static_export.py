@@ -0,0 +1,186 @@
+# Exportación estática de todas las variantes de los gráficos, para servirlas desde un CDN:
+#   python static_export.py --output static [--charts chart1 chart3]
+# Recorre las páginas de gráficos del menú de app.py con cada combinación de parámetros
+# (PERIODO, distrito, nivel de detalle) y escribe por variante la figura en JSON y en HTML
+# autónomo, la tabla que la acompaña en CSV, un index.html y manifest.json. La aplicación
+# lee el manifiesto (StaticSite) y usa la figura pre-renderizada si su versión de los datos
+# coincide con la actual; si no, la construye como siempre.
+import argparse
+import html
+import json
+import os
+import time
+
+# Directorio de la exportación que usa la aplicación (si no existe, no se usa)
+STATIC_DIR = os.environ.get('RSOLIDOS_STATIC_DIR', 'static')
+MANIFEST_NAME = 'manifest.json'
+RESIDUOS_CSV = 'residuos_municipales.csv'
+UBIGEOS_CSV = 'TB_UBIGEOS.csv'
+CHART_IDS = ['chart1', 'chart2', 'chart3', 'chart4_map', 'chart4_bar', 'chart5']
+
+
+def variant_name(params):
+    # Nombre de archivo de una variante: 'periodo=2014,zoom=5' ('index' si no tiene parámetros)
+    return ','.join(f'{k}={v}' for k, v in sorted(params.items())) or 'index'
+
+
+def variant_key(chart_id, params):
+    return (chart_id, tuple(sorted((k, str(v)) for k, v in params.items())))
+
+
+class StaticSite:
+    # Manifiesto de una exportación: figura pre-renderizada por (gráfico, parámetros)
+    def __init__(self, root=STATIC_DIR):
+        self.root = root
+        self.variants = {}
+        self.generated = None
+        manifest_path = os.path.join(root, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return
+        with open(manifest_path, encoding='utf-8') as fh:
+            manifest = json.load(fh)
+        self.generated = manifest['generated']
+        for entry in manifest['variants']:
+            self.variants[variant_key(entry['chart_id'], entry['params'])] = entry
+
+    def __len__(self):
+        return len(self.variants)
+
+    def figure_json(self, chart_id, params, data_version):
+        # JSON de la figura exportada, o None si no existe o es de otra versión de los datos
+        entry = self.variants.get(variant_key(chart_id, params))
+        if entry is None or entry['version'] != data_version:
+            return None
+        try:
+            with open(os.path.join(self.root, entry['json']), encoding='utf-8') as fh:
+                return fh.read()
+        except OSError:
+            return None
+
+
+def _chart_variants(store, cube, engine, index, geo_table, ubigeos_version, chart_ids=None):
+    # (página del menú, id del gráfico, parámetros, versión, figura, tabla) de cada variante de
+    # los gráficos `chart_ids` (todos si es None); las tablas de los demás ni se calculan. Las
+    # versiones son las mismas que usa data_version() de app.py en la caché de figuras
+    import charts
+    import geo
+
+    def wanted(*ids):
+        return not chart_ids or any(chart_id in chart_ids for chart_id in ids)
+
+    def version(periodo=None):
+        return (store.versions[periodo] if periodo is not None else store.version) + '-' + ubigeos_version
+
+    if wanted('chart1'):
+        yield 'Inicio > Gráfico 1', 'chart1', {}, version(), lambda: charts.build_chart1(cube), None
+    if wanted('chart2'):
+        yield 'Inicio > Gráfico 2', 'chart2', {}, version(), lambda: charts.build_chart2(cube), None
+    if wanted('chart3'):
+        for periodo in cube.periodos:
+            table = charts.chart3_query(engine, periodo)
+            yield ('Inicio > Gráfico 3', 'chart3', {'periodo': periodo}, version(periodo),
+                   lambda: charts.build_chart3(cube, periodo), table)
+    if wanted('chart4_map', 'chart4_bar'):
+        for departamento in index.departamentos():
+            for provincia in index.provincias(departamento):
+                for distrito in index.distritos(departamento, provincia):
+                    ubigeo = index.ubigeo(departamento, provincia, distrito)
+                    merged_df = charts.chart4_table(geo_table, ubigeo)
+                    if merged_df.empty:
+                        continue
+                    if wanted('chart4_map'):
+                        yield ('Inicio > Gráfico 4', 'chart4_map', {'ubigeo': ubigeo}, version(),
+                               lambda: charts.build_chart4_map(merged_df), merged_df)
+                    if wanted('chart4_bar'):
+                        yield ('Inicio > Gráfico 4', 'chart4_bar', {'ubigeo': ubigeo}, version(),
+                               lambda: charts.build_chart4_bar(merged_df), None)
+    if wanted('chart5'):
+        for periodo in cube.periodos:
+            for zoom in geo.ZOOM_CELL_DEGREES:
+                yield ('Inicio > Gráfico 5', 'chart5', {'periodo': periodo, 'zoom': zoom}, version(periodo),
+                       lambda: charts.build_chart5(geo_table, periodo, zoom), None)
+
+
+def _write_text(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        fh.write(text)
+    os.replace(tmp_path, path)
+
+
+def _read_manifest(output):
+    try:
+        with open(os.path.join(output, MANIFEST_NAME), encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_index(output, entries):
+    items = ''.join(
+        f'<li>{html.escape(e["page"])} &mdash; {html.escape(e["chart_id"])} '
+        f'<a href="{html.escape(e["html"])}">{html.escape(variant_name(e["params"]))}</a></li>\n'
+        for e in entries)
+    _write_text(os.path.join(output, 'index.html'),
+                '<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Residuos Municipales</title></head>\n'
+                f'<body><h2>Residuos Municipales</h2>\n<ul>\n{items}</ul></body></html>\n')
+
+
+def export_site(output=STATIC_DIR, chart_ids=None, residuos_csv=RESIDUOS_CSV, ubigeos_csv=UBIGEOS_CSV):
+    # Escribe todas las variantes (o solo las de `chart_ids`) y el manifiesto; devuelve el manifiesto.
+    # Con `chart_ids` se conservan las variantes de los demás gráficos de una exportación anterior
+    import aggregates
+    import data_store
+    import geo
+    import query
+
+    store = data_store.ResiduosStore(residuos_csv)
+    df = store.frame()
+    dful = data_store.read_ubigeos(ubigeos_csv)
+    ubigeos_version = data_store.data_version(ubigeos_csv)
+    cube = aggregates.Cube(df, store.versions)
+    engine = query.QueryEngine(cube, store.frame, version=store.version)
+    index = geo.UbigeoIndex(df)
+    geo_table = geo.GeoTable(df, dful)
+
+    entries = []
+    if chart_ids:
+        previous = _read_manifest(output)
+        if previous is not None:
+            entries = [e for e in previous['variants'] if e['chart_id'] not in chart_ids]
+    variants = _chart_variants(store, cube, engine, index, geo_table, ubigeos_version, chart_ids)
+    for page, chart_id, params, version, build, table in variants:
+        fig = build()
+        stem = os.path.join(chart_id, variant_name(params))
+        entry = {'page': page, 'chart_id': chart_id, 'params': params, 'version': version,
+                 'json': stem + '.json', 'html': stem + '.html', 'table': None}
+        _write_text(os.path.join(output, entry['json']), fig.to_json())
+        # HTML autónomo: plotly.js desde su CDN, así cada archivo pesa solo lo de la figura
+        _write_text(os.path.join(output, entry['html']), fig.to_html(include_plotlyjs='cdn', full_html=True))
+        if table is not None:
+            entry['table'] = stem + '.csv'
+            _write_text(os.path.join(output, entry['table']), table.to_csv(index=False))
+        entries.append(entry)
+
+    manifest = {'generated': time.time(), 'data_version': store.version + '-' + ubigeos_version,
+                'variants': entries}
+    _write_index(output, entries)
+    # El manifiesto se escribe al final: la aplicación nunca ve uno que apunte a archivos a medio escribir
+    _write_text(os.path.join(output, MANIFEST_NAME), json.dumps(manifest, indent=1, default=str))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportar las figuras y tablas de todos los gráficos a archivos estáticos")
+    parser.add_argument('--output', default=STATIC_DIR, help="directorio de salida")
+    parser.add_argument('--charts', nargs='+', choices=CHART_IDS,
+                        help="solo estos gráficos; los demás se conservan de la exportación anterior")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    manifest = export_site(args.output, args.charts)
+    print(f"{len(manifest['variants'])} variantes en {args.output} ({time.perf_counter() - start:.1f} s)")
+
+
+if __name__ == '__main__':
+    main()
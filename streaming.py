@@ -0,0 +1,143 @@
+# Carga por bloques de CSV de residuos grandes (millones de filas) con memoria acotada. La usa
+# data_store para convertir los CSV en particiones por PERIODO sin leerlos enteros; desde la
+# línea de comandos arma el cubo con tipos reducidos y mide la memoria usada contra el presupuesto:
+#   python streaming.py residuos_distrito_mes.csv --memory-mb 256
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import time
+
+import pandas as pd
+
+import aggregates
+import data_store
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Tipos reducidos para el cubo: los de data_store con float32 en lugar de float64 (la mitad
+# de memoria; las sumas del cubo se hacen igual en float64)
+STREAM_DTYPES = {c: 'float32' if dtype == 'float64' else dtype for c, dtype in data_store.RESIDUOS_DTYPES.items()}
+
+# Filas leídas para estimar cuánto ocupa una fila en memoria
+SAMPLE_ROWS = 2000
+# Copias transitorias de un bloque mientras se procesa (buffers del parser, conversión a
+# float64 para sumar y el groupby); el bloque se dimensiona para que quepan en el presupuesto
+CHUNK_OVERHEAD = 4
+MIN_CHUNK_ROWS = 1000
+
+
+def peak_rss_mb():
+    # Pico de memoria residente del proceso (ru_maxrss está en KB en Linux y en bytes en macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def rss_mb():
+    # Memoria residente actual del proceso (de /proc en Linux; si no, el pico)
+    rss = instrumentation.current_rss_mb()
+    return peak_rss_mb() if rss is None else rss
+
+
+def _read_csv(csv_path, dtype, **kwargs):
+    return pd.read_csv(csv_path, encoding="latin1", delimiter=";", dtype=dtype, **kwargs)
+
+
+def chunk_rows_for_budget(csv_path, memory_budget_mb, dtype=STREAM_DTYPES):
+    # Tamaño de bloque para no superar `memory_budget_mb` con un bloque en proceso
+    sample = _read_csv(csv_path, dtype, nrows=SAMPLE_ROWS)
+    bytes_per_row = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+    rows = int(memory_budget_mb * 1024 * 1024 / (bytes_per_row * CHUNK_OVERHEAD))
+    return max(rows, MIN_CHUNK_ROWS)
+
+
+def iter_chunks(csv_path, chunk_rows, dtype=STREAM_DTYPES):
+    # Bloques de `chunk_rows` filas con los tipos `dtype`; FECHA_CORTE queda como índice
+    with _read_csv(csv_path, dtype, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield chunk.set_index('FECHA_CORTE')
+
+
+class StreamReport:
+    # Resumen de una carga por bloques: filas, bloques, tiempo, filas/s y memoria medida. La
+    # memoria usada es la residente por encima de la de antes de empezar, medida tras cada bloque
+    def __init__(self, csv_path, chunk_rows, memory_budget_mb):
+        self.csv_path = csv_path
+        self.chunk_rows = chunk_rows
+        self.memory_budget_mb = memory_budget_mb
+        self.rows = 0
+        self.chunks = 0
+        self.seconds = 0.0
+        self.baseline_rss_mb = rss_mb()
+        self.used_mb = 0.0
+        self.peak_rss_mb = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def within_budget(self):
+        return self.memory_budget_mb is None or self.used_mb <= self.memory_budget_mb
+
+    def counted(self, chunks):
+        # Pasa los bloques contando filas y midiendo la memoria después de procesar cada uno
+        start = time.perf_counter()
+        for chunk in chunks:
+            self.rows += len(chunk)
+            self.chunks += 1
+            yield chunk
+            self.used_mb = max(self.used_mb, rss_mb() - self.baseline_rss_mb)
+        self.seconds = time.perf_counter() - start
+        self.peak_rss_mb = peak_rss_mb()
+        if not self.within_budget:
+            logger.warning("Loading %s used %.0f MB, over the %.0f MB budget; use smaller chunks than %d rows",
+                           self.csv_path, self.used_mb, self.memory_budget_mb, self.chunk_rows)
+
+    def as_dict(self):
+        return {
+            'csv_path': self.csv_path,
+            'file_mb': round(os.path.getsize(self.csv_path) / (1024 * 1024), 2),
+            'chunk_rows': self.chunk_rows,
+            'memory_budget_mb': self.memory_budget_mb,
+            'rows': self.rows,
+            'chunks': self.chunks,
+            'seconds': round(self.seconds, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+            'used_mb': round(self.used_mb, 1),
+            'within_budget': self.within_budget,
+            'peak_rss_mb': round(self.peak_rss_mb, 1),
+        }
+
+
+def stream(csv_path, memory_budget_mb=256, chunk_rows=None, dtype=STREAM_DTYPES):
+    # (bloques del CSV dimensionados para el presupuesto, reporte que se completa al recorrerlos)
+    chunk_rows = chunk_rows or chunk_rows_for_budget(csv_path, memory_budget_mb, dtype)
+    report = StreamReport(csv_path, chunk_rows, memory_budget_mb)
+    return report.counted(iter_chunks(csv_path, chunk_rows, dtype)), report
+
+
+def stream_cube(csv_path, memory_budget_mb=256, chunk_rows=None):
+    # Arma el cubo de agregados leyendo el CSV por bloques; devuelve (cubo, reporte)
+    chunks, report = stream(csv_path, memory_budget_mb, chunk_rows)
+    cube = aggregates.Cube.from_chunks(chunks)
+    return cube, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cargar un CSV de residuos por bloques y reportar filas/s y memoria")
+    parser.add_argument('csv_path')
+    parser.add_argument('--memory-mb', type=float, default=256, help="presupuesto de memoria por bloque (MB)")
+    parser.add_argument('--chunk-rows', type=int, default=None, help="filas por bloque (por defecto, según el presupuesto)")
+    args = parser.parse_args()
+    _cube, report = stream_cube(args.csv_path, args.memory_mb, args.chunk_rows)
+    print(json.dumps(report.as_dict(), indent=2))
+    if not report.within_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# Tablas paginadas del lado del servidor: ordenamiento, selección de columnas y ventana de filas
+# sobre un DataFrame ya cacheado, para enviar al navegador solo la página visible. La tabla
+# completa se exporta por lotes (CSV o Parquet) a un archivo en disco, sin armarla entera en memoria.
+import hashlib
+import os
+import threading
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PAGE_SIZES = [25, 50, 100, 500]
+EXPORT_BATCH_ROWS = 50_000
+EXPORT_FORMATS = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+
+class Table:
+    # Vista paginable de un DataFrame de solo lectura; el orden de cada columna se calcula
+    # una vez y se reutiliza en las páginas siguientes
+    def __init__(self, df):
+        self.df = df
+        self.columns = list(df.columns)
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.df)
+
+    def page_count(self, page_size):
+        return max((len(self.df) + page_size - 1) // page_size, 1)
+
+    def order(self, sort_by=None, ascending=True):
+        # Posiciones de las filas en el orden pedido (None: el orden original)
+        if sort_by is None:
+            return None
+        if sort_by not in self.columns:
+            raise ValueError(f"Unknown column: {sort_by}. Must be in {self.columns}.")
+        key = (sort_by, ascending)
+        with self._lock:
+            if key not in self._orders:
+                # Orden estable y valores faltantes al final, como DataFrame.sort_values
+                self._orders[key] = self.df[sort_by].reset_index(drop=True) \
+                    .sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+            return self._orders[key]
+
+    def _project(self, columns):
+        columns = list(columns or self.columns)
+        unknown = [c for c in columns if c not in self.columns]
+        if unknown:
+            raise ValueError(f"Unknown columns: {unknown}. Must be in {self.columns}.")
+        return columns
+
+    def window(self, page=1, page_size=PAGE_SIZES[0], sort_by=None, ascending=True, columns=None):
+        # Filas de la página `page` (desde 1) con solo las columnas pedidas
+        columns = self._project(columns)
+        page = min(max(int(page), 1), self.page_count(page_size))
+        start = (page - 1) * page_size
+        order = self.order(sort_by, ascending)
+        positions = slice(start, start + page_size) if order is None else order[start:start + page_size]
+        return self.df.iloc[positions][columns]
+
+    def iter_batches(self, sort_by=None, ascending=True, columns=None, batch_rows=EXPORT_BATCH_ROWS):
+        # La tabla completa en lotes de `batch_rows` filas, en el orden y columnas pedidos
+        columns = self._project(columns)
+        order = self.order(sort_by, ascending)
+        # Una tabla vacía da un lote vacío, para que el archivo tenga igual encabezado o esquema
+        for start in range(0, max(len(self.df), 1), batch_rows):
+            positions = slice(start, start + batch_rows) if order is None else order[start:start + batch_rows]
+            yield self.df.iloc[positions][columns]
+
+    def iter_csv(self, index=True, **kwargs):
+        # Texto CSV por lotes (encabezado solo en el primero), p. ej. para una respuesta HTTP por partes
+        for i, batch in enumerate(self.iter_batches(**kwargs)):
+            yield batch.to_csv(index=index, header=i == 0)
+
+    def write(self, path, fmt, index=True, **kwargs):
+        # Escribe la tabla completa en `path` lote a lote, sin armar el archivo en memoria
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        if fmt == 'csv':
+            with open(tmp_path, 'w', encoding='utf-8', newline='') as fh:
+                for chunk in self.iter_csv(index=index, **kwargs):
+                    fh.write(chunk)
+        elif fmt == 'parquet':
+            writer = None
+            try:
+                for batch in self.iter_batches(**kwargs):
+                    arrow_batch = pa.Table.from_pandas(batch, preserve_index=index)
+                    if writer is None:
+                        writer = pq.ParquetWriter(tmp_path, arrow_batch.schema)
+                    writer.write_table(arrow_batch.cast(writer.schema))
+            finally:
+                if writer is not None:
+                    writer.close()
+        else:
+            raise ValueError(f"Unknown export format: {fmt}. Must be in {list(EXPORT_FORMATS)}.")
+        os.replace(tmp_path, path)
+        return path
+
+
+def export_path(directory, version, name, fmt, **kwargs):
+    # Archivo de exportación de una tabla: uno por versión de los datos, consulta y vista;
+    # al crear los de una versión nueva se borran los de versiones anteriores
+    digest = hashlib.sha256(repr((name, sorted(kwargs.items()))).encode()).hexdigest()[:16]
+    os.makedirs(directory, exist_ok=True)
+    for old in os.listdir(directory):
+        if not old.startswith(version + '-') and not old.endswith('.tmp'):
+            try:
+                os.remove(os.path.join(directory, old))
+            except OSError:
+                pass
+    return os.path.join(directory, f'{version}-{digest}.{fmt}')
@@ -0,0 +1,139 @@
+# Cube.sync frente a un cubo armado desde cero: después de agregar, reemplazar o quitar un
+# PERIODO, cada rollup y consulta memorizada debe coincidir con Cube(store.frame())
+import threading
+
+import pandas as pd
+import pytest
+
+import aggregates
+import data_store
+
+RESIDUOS_CSV = 'residuos_municipales.csv'
+# Rollups y consultas extra para que sync tenga de todo en caché, no solo los del menú
+EXTRA_ROLLUPS = [[], ['DEPARTAMENTO', 'PROVINCIA'], ['PERIODO', 'DISTRITO'], ['PERIODO', 'DEPARTAMENTO', 'PROVINCIA']]
+
+
+@pytest.fixture
+def raw():
+    return pd.read_csv(RESIDUOS_CSV, encoding='latin1', delimiter=';', dtype={'UBIGEO': str})
+
+
+@pytest.fixture
+def store(tmp_path, raw):
+    cache_dir = data_store.CACHE_DIR
+    data_store.set_cache_dir(str(tmp_path / 'cache'))
+    # El CSV base se copia para poder editarlo en las pruebas
+    base_csv = tmp_path / RESIDUOS_CSV
+    _write_csv(raw, base_csv)
+    yield data_store.ResiduosStore(str(base_csv))
+    data_store.set_cache_dir(cache_dir)
+
+
+def _write_csv(df, path):
+    df.to_csv(path, sep=';', index=False, encoding='latin1', float_format='%.2f')
+
+
+def _cube(store):
+    cube = aggregates.Cube(store.frame(), store.versions)
+    for keys in EXTRA_ROLLUPS:
+        cube.rollup(keys)
+    for periodo in cube.periodos:
+        cube.slice('DEPARTAMENTO', PERIODO=periodo)
+    cube.slice('PERIODO', DEPARTAMENTO='LIMA')
+    return cube
+
+
+def _assert_matches_fresh(cube, store):
+    fresh = aggregates.Cube(store.frame(), store.versions)
+    assert cube.versions == store.versions
+    assert cube.periodos == fresh.periodos
+    for keys in list(cube._rollups) + [aggregates._normalize_keys(k) for k in EXTRA_ROLLUPS]:
+        pd.testing.assert_frame_equal(cube.rollup(keys), fresh.rollup(keys), check_index_type=False,
+                                      check_categorical=False, obj=f'rollup {keys}')
+    for keys, filters in list(cube._slices) + [(('DEPARTAMENTO',), (('PERIODO', p),)) for p in fresh.periodos]:
+        pd.testing.assert_frame_equal(cube.slice(keys, **dict(filters)), fresh.slice(keys, **dict(filters)),
+                                      check_index_type=False, check_categorical=False,
+                                      obj=f'slice {keys} {filters}')
+
+
+def _sync(cube, store):
+    store.refresh()
+    return cube.sync(store.partitions, store.versions)
+
+
+def test_sync_add_periodo(store, raw, tmp_path):
+    cube = _cube(store)
+    new = raw[raw['PERIODO'] == 2021].assign(PERIODO=2022)
+    new['QRESIDUOS_MUN'] = new['QRESIDUOS_MUN'] * 1.5
+    _write_csv(new, tmp_path / 'residuos_2022.csv')
+    data_store.ingest_period(str(tmp_path / 'residuos_2022.csv'))
+    assert _sync(cube, store) == [2022]
+    _assert_matches_fresh(cube, store)
+
+
+def test_sync_replace_periodo(store, raw, tmp_path):
+    cube = _cube(store)
+    replaced = raw[raw['PERIODO'] == 2016].copy()
+    replaced['QRESIDUOS_DOM'] = replaced['QRESIDUOS_DOM'] * 2
+    replaced['QRESIDUOS_MUN'] = replaced['QRESIDUOS_DOM'] + replaced['QRESIDUOS_NO_DOM']
+    # Un distrito que deja de reportar en la republicación
+    replaced = replaced[replaced['DISTRITO'] != replaced['DISTRITO'].iloc[0]]
+    _write_csv(replaced, tmp_path / 'residuos_2016.csv')
+    data_store.ingest_period(str(tmp_path / 'residuos_2016.csv'), replace=True)
+    assert _sync(cube, store) == [2016]
+    _assert_matches_fresh(cube, store)
+
+
+def test_sync_remove_periodo(store, raw, tmp_path):
+    cube = _cube(store)
+    # Quitar un PERIODO del CSV base vuelve a versionar todas sus particiones
+    _write_csv(raw[raw['PERIODO'] != 2014], tmp_path / RESIDUOS_CSV)
+    assert _sync(cube, store) == sorted(raw['PERIODO'].unique().tolist())
+    assert 2014 not in cube.periodos
+    _assert_matches_fresh(cube, store)
+
+
+def test_sync_retries_failed_periodo(store, raw, tmp_path, monkeypatch):
+    cube = _cube(store)
+    new = raw[raw['PERIODO'] == 2021].assign(PERIODO=2022)
+    _write_csv(new, tmp_path / 'residuos_2022.csv')
+    data_store.ingest_period(str(tmp_path / 'residuos_2022.csv'))
+    store.refresh()
+    update = cube._update_periodo
+
+    def _fail(periodo, df_part):
+        raise RuntimeError('sync interrupted')
+    monkeypatch.setattr(cube, '_update_periodo', _fail)
+    with pytest.raises(RuntimeError):
+        cube.sync(store.partitions, store.versions)
+    assert 2022 not in cube.versions
+    monkeypatch.setattr(cube, '_update_periodo', update)
+    assert cube.sync(store.partitions, store.versions) == [2022]
+    _assert_matches_fresh(cube, store)
+
+
+
+def test_sync_keeps_queries_made_meanwhile(store, raw, tmp_path, monkeypatch):
+    cube = aggregates.Cube(store.frame(), store.versions)
+    new = raw[raw['PERIODO'] == 2021].assign(PERIODO=2022)
+    _write_csv(new, tmp_path / 'residuos_2022.csv')
+    data_store.ingest_period(str(tmp_path / 'residuos_2022.csv'))
+    store.refresh()
+    update = cube._update_periodo
+    queries = []
+
+    def _update_with_query(periodo, df_part):
+        # Otra sesión pide un rollup y una consulta nuevos en medio de sync
+        query = threading.Thread(target=lambda: cube.slice('DEPARTAMENTO', PROVINCIA='LIMA'))
+        query.start()
+        query.join(timeout=0.5)
+        queries.append(query)
+        update(periodo, df_part)
+    monkeypatch.setattr(cube, '_update_periodo', _update_with_query)
+    cube.sync(store.partitions, store.versions)
+    for query in queries:
+        query.join()
+    # No se pierden en el reemplazo de los diccionarios y salen del cubo ya sincronizado
+    assert ('DEPARTAMENTO', 'PROVINCIA') in cube._rollups
+    assert (('DEPARTAMENTO',), (('PROVINCIA', 'LIMA'),)) in cube._slices
+    _assert_matches_fresh(cube, store)
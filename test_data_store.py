@@ -0,0 +1,55 @@
+# Conversión por bloques de los CSV de residuos en particiones por PERIODO: el resultado debe
+# ser el mismo que leer el CSV entero, y un archivo inválido no debe tocar las particiones
+import os
+
+import pandas as pd
+import pytest
+
+import data_store
+import streaming
+
+RESIDUOS_CSV = 'residuos_municipales.csv'
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    cache_dir = data_store.CACHE_DIR
+    data_store.set_cache_dir(str(tmp_path / 'cache'))
+    # Presupuesto mínimo: bloques de streaming.MIN_CHUNK_ROWS filas, varios por PERIODO
+    monkeypatch.setattr(data_store, 'CSV_MEMORY_MB', 0.01)
+    yield tmp_path
+    data_store.set_cache_dir(cache_dir)
+
+
+def test_partitions_match_full_read(cache_dir):
+    store = data_store.ResiduosStore(RESIDUOS_CSV)
+    expected = data_store.read_residuos_csv(RESIDUOS_CSV)
+    assert len(expected) > 2 * streaming.MIN_CHUNK_ROWS
+    pd.testing.assert_frame_equal(store.frame(), expected, check_categorical=False)
+    assert sorted(store.partitions) == sorted(expected['PERIODO'].unique().tolist())
+    # Los trozos intermedios no quedan en disco
+    assert not [name for name in os.listdir(data_store.PARTITIONS_DIR) if name.startswith('.spool')]
+
+
+def test_ingest_rejects_invalid_file(cache_dir):
+    store = data_store.ResiduosStore(RESIDUOS_CSV)
+    versions = dict(store.versions)
+    raw = pd.read_csv(RESIDUOS_CSV, encoding='latin1', delimiter=';', dtype={'UBIGEO': str})
+    bad = raw[raw['PERIODO'] == 2021].assign(PERIODO=2022).drop(columns='GPC_DOM')
+    bad.to_csv(cache_dir / 'residuos_2022.csv', sep=';', index=False, encoding='latin1')
+    with pytest.raises(ValueError, match='GPC_DOM'):
+        data_store.ingest_period(str(cache_dir / 'residuos_2022.csv'))
+    existing = raw[raw['PERIODO'] == 2021]
+    existing.to_csv(cache_dir / 'residuos_2021.csv', sep=';', index=False, encoding='latin1')
+    with pytest.raises(ValueError, match='already loaded'):
+        data_store.ingest_period(str(cache_dir / 'residuos_2021.csv'))
+    assert store.refresh() == []
+    assert store.versions == versions
+
+
+def test_stream_report_checks_budget():
+    cube, report = streaming.stream_cube(RESIDUOS_CSV, memory_budget_mb=64)
+    assert report.rows == len(data_store.read_residuos_csv(RESIDUOS_CSV))
+    assert report.within_budget
+    report.memory_budget_mb = report.used_mb / 2 if report.used_mb else -1
+    assert not report.within_budget
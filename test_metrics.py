@@ -0,0 +1,76 @@
+# Métricas derivadas de metrics.py sobre el cubo: tasas ponderadas por población, crecimiento
+# alineado por PERIODO, participación en el total nacional y NaN con denominador cero
+import numpy as np
+import pandas as pd
+import pytest
+
+import aggregates
+import metrics
+
+RESIDUOS_CSV = 'residuos_municipales.csv'
+DISTRICT_KEYS = metrics.METRIC_LEVELS['distrito']
+
+
+@pytest.fixture(scope='module')
+def raw():
+    return pd.read_csv(RESIDUOS_CSV, encoding='latin1', delimiter=';', dtype={'UBIGEO': str})
+
+
+@pytest.fixture(scope='module')
+def derived(raw):
+    return metrics.DerivedMetrics(aggregates.Cube(raw))
+
+
+def test_per_capita_is_population_weighted(raw, derived):
+    rows = raw[(raw['PERIODO'] == 2014) & (raw['DEPARTAMENTO'] == 'CUSCO')]
+    row = derived.get('departamento', 2014, 'CUSCO')
+    weighted = rows['QRESIDUOS_DOM'].sum() / rows['POB_URBANA'].sum() * metrics.TON_YEAR_TO_KG_DAY
+    assert row['PER_CAPITA_DOM'] == pytest.approx(weighted)
+    # El promedio de GPC_DOM de los distritos da otra cosa (pesa igual un distrito de 300 habitantes)
+    assert abs(row['PER_CAPITA_DOM'] - rows['GPC_DOM'].mean()) > 0.1
+    assert row['PER_CAPITA_MUN'] == pytest.approx(
+        rows['QRESIDUOS_MUN'].sum() / rows['POB_TOTAL'].sum() * metrics.TON_YEAR_TO_KG_DAY)
+
+
+def test_per_capita_dom_matches_gpc_dom(raw, derived):
+    table = derived.table('distrito').reset_index()
+    merged = raw.merge(table[DISTRICT_KEYS + ['PER_CAPITA_DOM']], on=DISTRICT_KEYS, validate='one_to_one')
+    diff = (merged['PER_CAPITA_DOM'] - merged['GPC_DOM']).abs().dropna()
+    # GPC_DOM se publica redondeado a dos decimales y unos pocos distritos no cuadran con sus
+    # propias columnas (p. ej. CALLAO 2014), así que se compara la mediana y no cada fila
+    assert len(diff) == (merged['POB_URBANA'] != 0).sum()
+    assert diff.median() < 1e-3
+    assert (diff <= 0.005 + 1e-9).mean() > 0.99
+
+
+def test_growth_aligns_with_previous_periodo(raw):
+    # Sin 2016: 2017 no tiene PERIODO anterior y no debe compararse con 2015
+    derived = metrics.DerivedMetrics(aggregates.Cube(raw[raw['PERIODO'] != 2016]))
+    lima = raw[raw['DEPARTAMENTO'] == 'LIMA'].groupby('PERIODO')['QRESIDUOS_MUN'].sum()
+    assert derived.get('departamento', 2015, 'LIMA')['CRECIMIENTO_MUN'] == pytest.approx(lima[2015] / lima[2014] - 1)
+    assert derived.get('departamento', 2018, 'LIMA')['CRECIMIENTO_MUN'] == pytest.approx(lima[2018] / lima[2017] - 1)
+    assert np.isnan(derived.get('departamento', 2014, 'LIMA')['CRECIMIENTO_MUN'])
+    assert np.isnan(derived.get('departamento', 2017, 'LIMA')['CRECIMIENTO_MUN'])
+    national = derived.table('nacional')['CRECIMIENTO_MUN']
+    assert np.isnan(national[2014]) and np.isnan(national[2017])
+    totals = raw.groupby('PERIODO')['QRESIDUOS_MUN'].sum()
+    assert national[2019] == pytest.approx(totals[2019] / totals[2018] - 1)
+
+
+@pytest.mark.parametrize('level', ['departamento', 'provincia', 'distrito'])
+def test_participation_sums_to_one(derived, level):
+    sums = derived.table(level)['PARTICIPACION'].groupby(level='PERIODO').sum()
+    assert sums.to_numpy() == pytest.approx(np.ones(len(derived.periodos)))
+    assert (derived.table('nacional')['PARTICIPACION'] == 1).all()
+
+
+def test_zero_denominator_is_nan():
+    index = pd.MultiIndex.from_tuples([(2014, 'A'), (2014, 'B')], names=['PERIODO', 'DEPARTAMENTO'])
+    rolled = pd.DataFrame({'QRESIDUOS_DOM': [10.0, 0.0], 'QRESIDUOS_NO_DOM': [0.0, 5.0], 'QRESIDUOS_MUN': [10.0, 5.0],
+                           'POB_TOTAL': [100, 0], 'POB_URBANA': [0, 0], 'POB_RURAL': [100, 0]}, index=index)
+    table = metrics.derive(rolled, pd.Series({2014: 15.0}))
+    assert table['PER_CAPITA_DOM'].isna().all()
+    assert np.isnan(table.loc[(2014, 'B'), 'PER_CAPITA_MUN'])
+    assert np.isnan(table.loc[(2014, 'A'), 'RATIO_DOM_NO_DOM'])
+    assert table.loc[(2014, 'B'), 'RATIO_DOM_NO_DOM'] == 0
+    assert not np.isinf(table[metrics.METRICS].to_numpy()).any()
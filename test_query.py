@@ -0,0 +1,106 @@
+# Consultas de query.py: forma canónica de las consultas (claves de la caché), consultas de
+# métricas derivadas y actualización del servidor al ingresar un PERIODO
+import pandas as pd
+import pytest
+
+import aggregates
+import data_store
+import query
+
+RESIDUOS_CSV = 'residuos_municipales.csv'
+
+
+@pytest.fixture
+def store(tmp_path):
+    cache_dir = data_store.CACHE_DIR
+    data_store.set_cache_dir(str(tmp_path / 'cache'))
+    yield data_store.ResiduosStore(RESIDUOS_CSV)
+    data_store.set_cache_dir(cache_dir)
+
+
+@pytest.fixture
+def engine(store):
+    return query.QueryEngine(aggregates.Cube(store.frame(), store.versions), store.frame, version=store.version)
+
+
+@pytest.mark.parametrize('a, b', [
+    ((('DEPARTAMENTO', 'PERIODO'),), (('PERIODO', 'DEPARTAMENTO'),)),
+    (('PERIODO', None), ('PERIODO', ['QRESIDUOS_MUN'])),
+    (('PERIODO', 'QRESIDUOS_MUN,POB_TOTAL'), ('PERIODO', ('QRESIDUOS_MUN', 'POB_TOTAL'))),
+])
+def test_normalize_query_equivalent_forms(a, b):
+    assert query.normalize_query(*a) == query.normalize_query(*b)
+
+
+def test_normalize_query_equivalent_filters():
+    key = query.normalize_query('DEPARTAMENTO', periodo='2015,2014', departamento=['LIMA', 'CUSCO'], periodo_min='2014')
+    same = query.normalize_query('DEPARTAMENTO', departamento='CUSCO,LIMA,LIMA', periodo_min=2014, periodo=[2014, 2015])
+    assert key == same
+    # Un filtro en None es lo mismo que no filtrar
+    assert query.normalize_query('PERIODO', ubigeo=None) == query.normalize_query('PERIODO')
+    assert query.normalize_query('PERIODO', ubigeo='010101') == query.normalize_query('PERIODO', ubigeo=10101)
+
+
+@pytest.mark.parametrize('kwargs, message', [
+    ({'group_by': 'REGION'}, 'Unknown group_by'),
+    ({'measures': 'QRESIDUOS'}, 'Unknown measures'),
+    ({'comuna': 'X'}, 'Unknown filter'),
+])
+def test_normalize_query_errors(kwargs, message):
+    with pytest.raises(ValueError, match=message):
+        query.normalize_query(**kwargs)
+
+
+def test_equivalent_queries_share_cache_entry(engine):
+    first = engine.run(['DEPARTAMENTO', 'PERIODO'], 'QRESIDUOS_MUN', periodo='2015,2014')
+    second = engine.run(('PERIODO', 'DEPARTAMENTO'), ['QRESIDUOS_MUN'], periodo=[2014, 2015])
+    pd.testing.assert_frame_equal(first, second)
+    assert engine.stats() == {'entries': 1, 'hits': 1, 'misses': 1}
+    # El resultado es una copia: modificarlo no altera la caché
+    first['QRESIDUOS_MUN'] = 0
+    assert engine.run(['PERIODO', 'DEPARTAMENTO'], periodo=[2014, 2015])['QRESIDUOS_MUN'].sum() > 0
+
+
+def test_metrics_by_level(engine):
+    result = engine.run('DEPARTAMENTO', ['PER_CAPITA_MUN', 'PARTICIPACION'], periodo=2014)
+    expected = engine.derived.table('departamento', 2014)
+    assert len(result) == len(expected)
+    assert result['PARTICIPACION'].sum() == pytest.approx(1)
+    by_periodo = engine.run(['PERIODO'], ['CRECIMIENTO_MUN'])
+    assert list(by_periodo['PERIODO']) == engine.cube.periodos
+
+
+@pytest.mark.parametrize('args, filters', [
+    # Sin PERIODO agrupado ni un solo PERIODO filtrado
+    (('DEPARTAMENTO', 'PER_CAPITA_MUN'), {}),
+    (('DEPARTAMENTO', 'PER_CAPITA_MUN'), {'periodo': '2014,2015'}),
+    # Agrupación que no es un nivel de metrics.METRIC_LEVELS
+    (('PROVINCIA', 'PER_CAPITA_MUN'), {'periodo': 2014}),
+    # Filtro por una columna fuera del nivel
+    (('DEPARTAMENTO', 'PER_CAPITA_MUN'), {'periodo': 2014, 'distrito': 'ASUNCION'}),
+    (('PERIODO', 'CRECIMIENTO_MUN'), {'reg_nat': 'SELVA'}),
+])
+def test_metrics_level_errors(engine, args, filters):
+    with pytest.raises(ValueError, match='Derived metrics'):
+        engine.run(*args, **filters)
+
+
+def test_server_syncs_cube_on_ingest(store, tmp_path):
+    server = query.QueryServer(store)
+    engine = server.engine()
+    cube = server.cube
+    engine.run('PERIODO')
+    raw = pd.read_csv(RESIDUOS_CSV, encoding='latin1', delimiter=';', dtype={'UBIGEO': str})
+    raw[raw['PERIODO'] == 2021].assign(PERIODO=2022).to_csv(
+        tmp_path / 'residuos_2022.csv', sep=';', index=False, encoding='latin1', float_format='%.2f')
+    data_store.ingest_period(str(tmp_path / 'residuos_2022.csv'))
+    updated = server.engine()
+    # Mismo cubo sincronizado; motor (métricas y caché de resultados) nuevo
+    assert server.cube is cube and updated is not engine
+    assert updated.stats()['entries'] == 0
+    assert cube.periodos[-1] == 2022
+    totals = updated.run('PERIODO').set_index('PERIODO')['QRESIDUOS_MUN']
+    assert totals[2022] == pytest.approx(totals[2021])
+    growth = updated.run('PERIODO', 'CRECIMIENTO_MUN').set_index('PERIODO')['CRECIMIENTO_MUN']
+    assert growth[2022] == pytest.approx(0, abs=1e-6)
+    assert server.engine() is updated
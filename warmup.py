@@ -0,0 +1,196 @@
+# Precalentamiento de las cachés al arrancar una réplica y señal de disponibilidad para el
+# balanceador. El primer rerun de la aplicación lanza warm_up() de app.py en un hilo de fondo
+# (carga de datos, cubo, métricas, índices y figuras de las selecciones por defecto); la
+# réplica queda lista cuando ese hilo termina sin errores. Streamlit no ejecuta app.py hasta
+# que se conecta una sesión, así que al arrancar hay que abrir una sin navegador:
+#   streamlit run app.py & python warmup.py http://127.0.0.1:8501
+# Señal de disponibilidad (cualquiera de las dos):
+#   RSOLIDOS_READY_PORT=8502: GET /ready responde 200 si está lista y 503 si no
+#   RSOLIDOS_READY_FILE=/tmp/rsolidos.ready: el archivo existe solo cuando está lista
+# Si una etapa falla no se reintenta: la réplica queda no lista (503, sin archivo) con el error
+# en el estado, para que el orquestador la reemplace en vez de enviarle tráfico en frío
+# El precalentamiento solo corre si se configuró alguna de las dos o RSOLIDOS_WARMUP=1: sin él,
+# un proceso que solo sirve 'Acerca' o 'Nosotros' no carga los datos (carga perezosa)
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger('rsolidos.warmup')
+
+READY_PORT = os.environ.get('RSOLIDOS_READY_PORT')
+READY_FILE = os.environ.get('RSOLIDOS_READY_FILE')
+ENABLED = bool(READY_PORT or READY_FILE) or os.environ.get('RSOLIDOS_WARMUP', '').lower() in ('1', 'true', 'yes', 'on')
+# Qué pasa con la disponibilidad si falla una etapa (se informa en status())
+FAILED_STEP_POLICY = 'unready'
+
+
+# Streamlit advierte por cada caché llamada fuera de una sesión; en el hilo de precalentamiento
+# eso es lo esperado (el nombre del logger cambió entre versiones de Streamlit)
+STREAMLIT_CONTEXT_LOGGERS = ['streamlit.runtime.scriptrunner_utils.script_run_context',
+                             'streamlit.runtime.scriptrunner.script_run_context']
+THREAD_NAME = 'rsolidos-warmup'
+
+
+class _WarmupThreadFilter(logging.Filter):
+    def filter(self, record):
+        return record.threadName != THREAD_NAME
+
+
+class Warmup:
+    # Estado del precalentamiento del proceso: etapas terminadas, tiempo y error si lo hubo
+    def __init__(self):
+        self.started = None
+        self.finished = None
+        self.steps = []
+        self.error = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, steps):
+        # Ejecuta `steps` (lista de (nombre, función)) en un hilo de fondo; solo la primera vez
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self.started = time.time()
+            if READY_FILE and os.path.exists(READY_FILE):
+                os.remove(READY_FILE)
+            for name in STREAMLIT_CONTEXT_LOGGERS:
+                logging.getLogger(name).addFilter(_WarmupThreadFilter())
+            self._thread = threading.Thread(target=self._run, args=(steps,), name=THREAD_NAME, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self, steps):
+        for name, step in steps:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as err:
+                # Las etapas siguientes igual se ejecutan (calientan lo que puedan), pero la
+                # réplica no se declara lista (ver FAILED_STEP_POLICY)
+                logger.exception("Warm-up step %s failed", name)
+                self.error = f'{name}: {err}'
+            self.steps.append({'step': name, 'seconds': time.perf_counter() - start})
+        self.finished = time.time()
+        if self.error:
+            logger.error("Warm-up failed after %.1f s, replica stays unready: %s", self.finished - self.started, self.error)
+            return
+        if READY_FILE:
+            with open(READY_FILE, 'w', encoding='utf-8') as fh:
+                fh.write(json.dumps(self.status()))
+        logger.info("Warm-up finished in %.1f s", self.finished - self.started)
+
+    def status(self):
+        return {
+            'enabled': ENABLED,
+            'ready': self.finished is not None and self.error is None,
+            'seconds': None if self.started is None else (self.finished or time.time()) - self.started,
+            'steps': list(self.steps),
+            'error': self.error,
+            'failed_step_policy': FAILED_STEP_POLICY,
+        }
+
+
+state = Warmup()
+
+
+def serve_readiness(port=READY_PORT, host='0.0.0.0'):
+    # Endpoint /ready del proceso (None si no se configuró puerto)
+    if not port:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status = state.status()
+            code = 200 if status['ready'] else 503
+            if self.path.split('?')[0] not in ('/ready', '/'):
+                code, status = 404, {'error': f'Unknown path: {self.path}'}
+            payload = json.dumps(status).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, int(port)), Handler)
+    threading.Thread(target=httpd.serve_forever, name='rsolidos-ready', daemon=True).start()
+    return httpd
+
+
+def start(steps):
+    # Punto de entrada desde app.py (una vez por proceso): endpoint de disponibilidad y hilo de
+    # fondo, o nada si el precalentamiento no está habilitado (ver ENABLED)
+    if not ENABLED:
+        return None
+    serve_readiness()
+    return state.start(steps)
+
+
+def kick(url, timeout=120):
+    # Abre una sesión de Streamlit sin navegador y espera a que termine su primer rerun
+    # (websockets es dependencia de Streamlit; los mensajes son los protobuf de Streamlit)
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+    from websockets.sync.client import connect
+
+    ws_url = url.replace('http://', 'ws://').replace('https://', 'wss://').rstrip('/') + '/_stcore/stream'
+    deadline = time.time() + timeout
+    while True:
+        try:
+            ws = connect(ws_url, subprotocols=['streamlit'], open_timeout=5)
+            break
+        except OSError:
+            # El servidor todavía está arrancando
+            if time.time() > deadline:
+                raise
+            time.sleep(1)
+    with ws:
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        message.rerun_script.page_script_hash = ''
+        ws.send(message.SerializeToString())
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(ws.recv(timeout=max(deadline - time.time(), 1)))
+            if forward.WhichOneof('type') == 'script_finished':
+                return forward.script_finished
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Abrir una sesión en la aplicación para que empiece a precalentar sus cachés")
+    parser.add_argument('url', nargs='?', default='http://127.0.0.1:8501')
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--wait-ready', metavar='READY_URL',
+                        help="esperar además a que este endpoint /ready responda 200")
+    args = parser.parse_args()
+    kick(args.url, args.timeout)
+    if args.wait_ready:
+        from urllib.error import HTTPError, URLError
+        from urllib.request import urlopen
+        deadline = time.time() + args.timeout
+        while time.time() < deadline:
+            try:
+                with urlopen(args.wait_ready, timeout=5) as response:
+                    print(response.read().decode('utf-8'))
+                    return
+            except HTTPError as err:
+                # 503 con error: una etapa falló y la réplica ya no va a quedar lista
+                status = json.loads(err.read().decode('utf-8') or '{}')
+                if status.get('error'):
+                    sys.exit(f"Replica warm-up failed: {status['error']}")
+                time.sleep(1)
+            except (URLError, OSError):
+                time.sleep(1)
+        sys.exit("Replica not ready after --timeout seconds")
+
+
+if __name__ == '__main__':
+    main()